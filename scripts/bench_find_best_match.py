@@ -0,0 +1,71 @@
+import argparse
+import random
+import string
+import time
+
+from ..src.magic4e import Magic4e, _magic_data
+from ..src.npc.careers4 import Careers4
+from ..src.npc.talents4 import Talents4
+from ..src.utility.find_best_match import FuzzyIndex
+
+def _typo(word : str) -> str:
+    """ One random edit to a word """
+    chars = list(word)
+    position = random.randrange(len(chars))
+    edit = random.choice(['insert', 'delete', 'replace', 'swap'])
+    if edit == 'insert':
+        chars.insert(position, random.choice(string.ascii_lowercase))
+    elif edit == 'delete' and len(chars) > 1:
+        del chars[position]
+    elif edit == 'replace':
+        chars[position] = random.choice(string.ascii_lowercase)
+    elif position < len(chars)-1:
+        chars[position], chars[position+1] = chars[position+1], chars[position]
+    return ''.join(chars)
+
+def _queries(options : list, n : int, max_length : int) -> dict:
+    """ Kinds of query, each a list of n targets """
+    return {'typo':        [_typo(random.choice(options)) for _ in range(n)],
+            'prefix':      [option[:random.randint(3, max(3, len(option)-1))] for option in random.choices(options, k=n)],
+            'no match':    [''.join(random.choices(string.ascii_letters + ' ', k=random.randint(3, 16))) for _ in range(n)],
+            'max length':  [''.join(random.choices(string.ascii_lowercase, k=max_length)) for _ in range(n)],
+            'metachars':   [''.join(random.choices('()[]*+?.\\^$|{}', k=random.randint(3, 16))) for _ in range(n)],
+            'paste':       [' '.join(random.choices(options, k=200)) for _ in range(n)]}
+
+def _time(index : FuzzyIndex, targets : list) -> tuple:
+    """ Mean and worst latency in ms, without the memo """
+    times = []
+    for target in targets:
+        index.cache_clear()
+        start = time.perf_counter()
+        index.best_match(target)
+        index.suggest(target)
+        times.append((time.perf_counter() - start) * 1000)
+    return sum(times)/len(times), max(times)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the latency of fuzzy matching, e.g. of careers and lores")
+    parser.add_argument("-n", type=int, default=200, help="Queries of each kind")
+    parser.add_argument("--mode", choices=FuzzyIndex.modes, default='staged')
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+
+    spells = list(dict.fromkeys(spell for lore in _magic_data.values() for spell in lore.get('spells', {})))
+    option_sets = {'careers':          Careers4().careers,
+                   'lores':            Magic4e().lores_all,
+                   'spells':           spells,
+                   'spells + talents': list(dict.fromkeys(spells + Talents4().get_talents()))}
+
+    print(f"{'options':18s} {'size':>5s} {'query':12s} {'mean ms':>8s} {'worst ms':>9s}")
+    for name, options in option_sets.items():
+        index = FuzzyIndex(options, args.mode)
+        for kind, targets in _queries(options, args.n, index.max_target_length).items():
+            mean, worst = _time(index, targets)
+            print(f"{name:18s} {len(options):5d} {kind:12s} {mean:8.3f} {worst:9.3f}")
+
+
+if __name__ == "__main__":
+    # execute only if run as a script
+    main()
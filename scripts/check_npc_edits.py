@@ -0,0 +1,50 @@
+import sys
+
+from ..src.npc4e import NPC4e
+
+def _check(checks : list, name : str, ok : bool) -> None:
+    checks.append((name, ok))
+    if not ok: print(f'FAILED: {name}')
+
+def check_characteristics(checks : list) -> None:
+    """ Edit one characteristic and render the statblock """
+    npc = NPC4e(careers=[('soldier', 2)], seed=1)
+    before = dict(npc.characteristics)
+    advance = before['WS'] - npc._npc.characteristics_base['WS']
+
+    npc.set_characteristics({'WS': 50})
+    after = npc.characteristics
+    _check(checks, 'set_characteristics keeps every characteristic', list(after) == list(before))
+    _check(checks, 'set_characteristics keeps the advances', after['WS'] == 50 + advance)
+    _check(checks, 'set_characteristics leaves the others alone', all(after[k] == v for k, v in before.items() if k != 'WS'))
+    _check(checks, 'statblock renders after an edit', '50' in npc.statblock)
+
+    try:
+        npc.set_characteristics({'WS': 30, 'Foo': 1})
+        _check(checks, 'set_characteristics rejects unknown characteristics', False)
+    except ValueError:
+        _check(checks, 'set_characteristics rejects unknown characteristics', npc.characteristics == after)
+
+def check_lore(checks : list) -> None:
+    """ Change the lore, by a short and a misspelt name """
+    npc = NPC4e(careers=[('wizard', 2)], seed=1)
+    for lore in ('fire', 'shadws'):
+        npc.set_lore(lore)
+        lorekey = npc._npc.to_dict()['lore']
+        _check(checks, f'set_lore({lore!r}) stores the lore it matched', lorekey == npc._npc._lore and lorekey.startswith('lore of'))
+        _check(checks, f'set_lore({lore!r}) heads the spells with the lore', lorekey.title() in npc.spells)
+
+def main():
+    """ Check the NPC4e edits leave the NPC in a state that can still be rendered """
+    checks = []
+    check_characteristics(checks)
+    check_lore(checks)
+
+    failures = sum(1 for _, ok in checks if not ok)
+    print(f'{len(checks)} checks, {failures} failed')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    # execute only if run as a script
+    main()
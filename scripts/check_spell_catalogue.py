@@ -0,0 +1,51 @@
+import re
+import sys
+
+from ..src.magic4e import _magic_data
+from ..src.magic.spell_catalogue import _normalise, spell_catalogue
+
+def _cited(source : str) -> set:
+    """ Every 'book' and 'book p.N' a Source cites, worked out without the catalogue's own parsing """
+    cited = set()
+    for part in (source or '').split(';'):
+        book, _, page = part.partition(',')
+        book = ' '.join(book.split()).casefold()
+        if not book: continue
+        cited.add(book)
+        number = re.search(r'\d+', page)
+        if number: cited.add(f'{book} p.{number.group()}')
+    return cited
+
+def _scan(**conditions) -> set:
+    """ The (name, lore) of every spell matching the conditions, by looking at every spell """
+    found = set()
+    for lorekey, lore in _magic_data.items():
+        for name, spell in lore['spells'].items():
+            if 'source' in conditions and conditions['source'] not in _cited(spell.get('Source')):
+                continue
+            if any(_normalise(spell.get(field)) != _normalise(value) for field, value in conditions.items() if field != 'source'):
+                continue
+            found.add((name, lorekey))
+    return found
+
+def main():
+    """ Check every query by source (book, and book and page) and by field value against a scan
+        of all the spells """
+    checks, failures = 0, 0
+    queries = [{'source': source} for source in spell_catalogue.sources()]
+    queries += [{field: value} for field in spell_catalogue.fields for value in spell_catalogue.values(field)]
+    for conditions in queries:
+        expected = _scan(**conditions)
+        got = set((spell.name, spell.lore) for spell in spell_catalogue.query(**conditions))
+        checks += 1
+        if got != expected:
+            failures += 1
+            print(f'{conditions}: {len(got)} found, {len(expected)} expected')
+
+    print(f'{checks} queries checked, {failures} failed')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    # execute only if run as a script
+    main()
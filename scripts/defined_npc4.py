@@ -3,7 +3,6 @@ import argparse, sys
 from ..src.npc.careers4 import Careers4
 from ..src.npc.buildNPC4 import *
 from ..src.npc.pretty_print_npc import pretty_print_npc
-from ..src.utility.find_best_match import find_best_match
 
 def main():
     ## Scroll down below the return for a better demo of how to programmatically interact with the Npc4 class
@@ -48,7 +47,7 @@ def main():
         # If there's a number trigger a new career rank
         if numbers:
             career = lastarg.strip().title()
-            career = find_best_match(career,Careers4().careers) # allow misspellings
+            career = Careers4().best_match(career) # allow misspellings
 
             if not firstgood:
                 # First time through we use the specified number as the 1:number
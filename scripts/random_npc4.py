@@ -3,7 +3,6 @@ import random
 from ..src.npc.careers4 import Careers4
 from ..src.npc.randomNPC4 import *
 from ..src.npc.pretty_print_npc import *
-from ..src.utility.find_best_match import find_best_match
 
 def main():
     random.seed()
@@ -33,7 +32,7 @@ def main():
 
     # Check if we've been given a target career and level
     if args.career and args.level:
-        career = find_best_match(args.career.title(),Careers4().careers)
+        career = Careers4().best_match(args.career)
         target = {"career":career,"rank":args.level}
     elif (args.career and not args.level) or (not args.career and args.level):
         print("Career and level must be input as a pair\n")
@@ -13,10 +13,16 @@ def main():
     args = parser.parse_args()
  
     m4 = Magic4e()
-    selection = m4.canonise_lore( ' '.join(args.lore)).title()
+    match = m4.match_lore(' '.join(args.lore))
+    if match.error:
+        print(match.error)
+        return
+
+    selection = match.lore.title()
     print(f'{args.nospells} spells selected randomly from {selection}:')
-    print('; '.join( m4.get_random_spells(selection,args.nospells) ))
-    if (m4.error): print(m4.error)
+    result = m4.random_spells(selection,args.nospells)
+    print('; '.join( result.spells ))
+    if (result.error): print(result.error)
 
     print('\nMinor Miscast:')
     for i in range(20):
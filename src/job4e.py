@@ -1,12 +1,19 @@
 import importlib.resources
 import json
-import random
 from typing import List
 
 from .. import data
+from .utility.weighted_table import WeightedTable
 with importlib.resources.open_text(data,'jobs.json') as f:
     _job_data = json.load(f)
 
+_who_table  = WeightedTable(_job_data["who"])
+_what_table = WeightedTable(_job_data["what"])
+_why_table  = WeightedTable(_job_data["why"])
+
+# A spy is disguised as one of the other whos, but not as another spy
+_spy_disguise_table = WeightedTable([who for who in _job_data["who"] if not who.startswith('A spy disguised as')])
+
 class Job4e():
     """ Create a job from the 4th ed GM screen booklet random roll tables """
     def __init__(self):
@@ -15,13 +22,12 @@ class Job4e():
     def get(self) -> List[str]:
         """ Return a list of who, what, and why strings"""
         
-        who  = random.choices(_job_data["who"])[0]
-        what = random.choices(_job_data["what"])[0]
-        why  = random.choices(_job_data["why"])[0]
+        who  = _who_table.draw()
+        what = _what_table.draw()
+        why  = _why_table.draw()
 
         if who.startswith('A spy disguised as'):
-            norerolls_whos = list(set(_job_data["who"]) - set(who))
-            who += ' ' + random.choices(norerolls_whos)[0]
+            who += ' ' + _spy_disguise_table.draw()
 
         return [who, what, why]
 
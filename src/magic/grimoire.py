@@ -1,6 +1,5 @@
-import random
-
-from ..magic4e import Magic4e
+from ..magic4e import magic
+from ..utility.weighted_table import WeightedTable
 
 grimoire_types = [80, 'book',
                   85, 'loose papers in a bag',
@@ -62,38 +61,44 @@ grimoire_characteristic_two = [20, 'Wrapped in treated leather to protect from f
                                100, 'Roll two more times.',
                               ]
 
+def _table(cum_table, drop_last=0):
+    """ Compile one of the tables above, optionally dropping some of the final entries """
+    end = len(cum_table)-2*drop_last
+    return WeightedTable(cum_table[1:end:2], cum_weights=cum_table[0:end:2])
+
+_types_table                = _table(grimoire_types)
+_total_spells_table         = _table(grimoire_total_spells)
+_max_cn_table               = _table(grimoire_max_cn)
+_lore_table                 = _table(grimoire_lore)
+_arcane_lore_table          = WeightedTable(['Light', 'Metal', 'Life', 'Heavens', 'Shadows', 'Death', 'Fire', 'Beasts'])
+_characteristic_one_table   = _table(grimoire_characteristic_one)
+_characteristic_two_table   = _table(grimoire_characteristic_two)
+_characteristic_two_rerolls = _table(grimoire_characteristic_two, drop_last=1)
+
 def random_grimoire():
-    type   = random.choices(grimoire_types[1::2], 
-                            cum_weights=grimoire_types[0::2],k=1)[0]
-    number = random.choices(grimoire_total_spells[1::2], 
-                            cum_weights=grimoire_total_spells[0::2],k=1)[0]
-    max_cn = random.choices(grimoire_max_cn[1::2], 
-                            cum_weights=grimoire_max_cn[0::2],k=1)[0]
-
-    lore   = random.choices(grimoire_lore[1::2], 
-                            cum_weights=grimoire_lore[0::2],k=1)[0]
-    m4 = Magic4e()
+    type   = _types_table.draw()
+    number = _total_spells_table.draw()
+    max_cn = _max_cn_table.draw()
+
+    lore   = _lore_table.draw()
     if lore == 'Arcane':
-        arcane_lore = random.choices(['Light', 'Metal', 'Life', 'Heavens', 'Shadows', 'Death', 'Fire', 'Beasts'])[0]
-        arcane_lore = m4.canonise_lore(arcane_lore)
+        arcane_lore = _arcane_lore_table.draw()
+        arcane_lore = magic.canonise_lore(arcane_lore)
         lore = 'arcane lore'
     if lore == 'Petty':
         lore = 'petty lore'
 
-    lore = m4.canonise_lore(lore)
+    lore = magic.canonise_lore(lore)
 
     if lore == 'arcane lore':
         lore = f'arcane lore ({arcane_lore.title()})'
 
-    spells = ', '.join(m4.get_random_spells(lore, number, max_cn).keys())
+    spells = ', '.join(magic.get_random_spells(lore, number, max_cn).keys())
 
-    char1 = random.choices(grimoire_characteristic_one[1::2], 
-                            cum_weights=grimoire_characteristic_one[0::2],k=1)[0]
-    char2 = random.choices(grimoire_characteristic_two[1::2], 
-                            cum_weights=grimoire_characteristic_two[0::2],k=1)[0]
+    char1 = _characteristic_one_table.draw()
+    char2 = _characteristic_two_table.draw()
     if char2 == 'Roll two more times.':
-        char2 = random.choices(grimoire_characteristic_two[1::2][0:-1], 
-                                cum_weights=grimoire_characteristic_two[0::2][0:-1],k=2)
+        char2 = _characteristic_two_rerolls.draw(2)
         char2 = ' '.join(char2)
 
     grimoire = f'A {type} containing {number} spells, with a max CN of {max_cn}, from {lore.title()}.\nThe spells are {spells}.\n{char1}\n{char2}'
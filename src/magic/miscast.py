@@ -1,49 +1,102 @@
+import collections
 import random
+import string
 
 from ...data import miscasts
+from ..utility.weighted_table import WeightedTable
 
-def _miscast_template(miscast_table):
-    """ Support function for miscasts """
+# One result of a miscast table, compiled once
+#   name     - e.g. 'Multiplying Misfortune'
+#   template - the text to show, with the name in bold, ready for str.format
+#   fields   - the placeholders the template uses, e.g. {'rolld10'}. Empty if the text is fixed
+MiscastEntry = collections.namedtuple('MiscastEntry', ['name', 'template', 'fields'])
+
+def _compile_entry(name, rules):
+    template = f'**{name}**: {rules}'
+    fields = frozenset(field for _, field, _, _ in string.Formatter().parse(template) if field)
+    return MiscastEntry(name, template, fields)
+
+def _compile_miscast_table(miscast_table):
+    """ Support function for miscasts. Build the weighted table of compiled entries once """
     miscast_names = miscast_table[0::3]
     miscast_prob  = miscast_table[1::3]
     miscast_rules = miscast_table[2::3]
 
-    miscast_result = random.choices(miscast_names, cum_weights=miscast_prob,k=1)[0]
+    entries = [_compile_entry(name, rules) for name, rules in zip(miscast_names, miscast_rules)]
+    return WeightedTable(entries, cum_weights=miscast_prob)
 
-    d10  = random.randint(1,10)
-    d100 = random.randint(1,100)
-    rolld10      = f'({d10})'
-    rolld10again = f'({random.randint(1,10)})'
-    rolld100     = f'({d100})'
-    rolld10by5   = f'({d10}×5= {d10*5})'
+_minor_miscasts    = _compile_miscast_table(miscasts.magic_miscasts_minor)
+_minor_rerolls     = _compile_miscast_table(miscasts.magic_miscasts_minor[:-6]) # Reroll results between 91-00
+_major_miscasts    = _compile_miscast_table(miscasts.magic_miscasts_major)
+_grimoire_miscasts = _compile_miscast_table(miscasts.magic_grimoire_miscasts)
 
-    idx = miscast_names.index(miscast_result)
-    miscast_text = f'**{miscast_result}**: {miscast_rules[idx]}'.format(rolld10=rolld10, rolld10again=rolld10again, rolld100=rolld100, rolld10by5=rolld10by5)
+def _render(entry : MiscastEntry, rng=None) -> str:
+    """ The text of a miscast, rolling only the dice its template uses. The dice are rolled
+        with rng (a random.Random) if given, otherwise the random module """
+    if not entry.fields:
+        return entry.template
 
-    return miscast_text, miscast_result
+    rng = rng or random
 
+    values = dict()
+    if 'rolld10' in entry.fields or 'rolld10by5' in entry.fields:
+        d10 = rng.randint(1,10)
+        values['rolld10']    = f'({d10})'
+        values['rolld10by5'] = f'({d10}×5= {d10*5})'
+    if 'rolld100' in entry.fields:
+        values['rolld100'] = f'({rng.randint(1,100)})'
+    if 'rolld10again' in entry.fields:
+        values['rolld10again'] = f'({rng.randint(1,10)})'
 
-def miscast_minor() -> str:
-    """ Return text describing a randomly rolled minor miscast. 
-    
-        Includes rerolls and escalations to major miscasts """
-    miscast_text, miscast_result = _miscast_template(miscasts.magic_miscasts_minor)
+    return entry.template.format(**values)
 
+def _miscast_template(miscast_table, rng=None):
+    """ Support function for miscasts """
+    entry = miscast_table.draw(rng=rng)
+    return _render(entry, rng), entry.name
+
+def _minor_escalations(miscast_text, miscast_result, rng=None):
+    """ Add the rerolls and escalations a minor miscast result calls for """
     if miscast_result == 'Multiplying Misfortune':
         miscast_text += '\n\nRolling again twice:\n'
-        miscast_text += _miscast_template(miscasts.magic_miscasts_minor[:-6])[0] + '\n'
-        miscast_text += _miscast_template(miscasts.magic_miscasts_minor[:-6])[0] + '\n'
+        miscast_text += _miscast_template(_minor_rerolls, rng)[0] + '\n'
+        miscast_text += _miscast_template(_minor_rerolls, rng)[0] + '\n'
 
     if miscast_result == 'Cascading Chaos':
-        miscast_text += '\n\nResult from Major Miscast Table:\n' + _miscast_template(miscasts.magic_miscasts_major)[0] + '\n'
+        miscast_text += '\n\nResult from Major Miscast Table:\n' + _miscast_template(_major_miscasts, rng)[0] + '\n'
 
     return miscast_text
 
-def miscast_grimoire() -> str:
+
+def miscast_minor(rng=None) -> str:
+    """ Return text describing a randomly rolled minor miscast.
+
+        Includes rerolls and escalations to major miscasts. Every roll uses rng (a random.Random)
+        if given, otherwise the random module """
+    return _minor_escalations(*_miscast_template(_minor_miscasts, rng), rng)
+
+def miscast_grimoire(rng=None) -> str:
     """ Return text describing a randomly rolled grimoire miscast. """
-    return _miscast_template(miscasts.magic_grimoire_miscasts)[0]
+    return _miscast_template(_grimoire_miscasts, rng)[0]
 
 
-def miscast_major() -> str:
+def miscast_major(rng=None) -> str:
     """ Return text describing a randomly rolled major miscast."""
-    return _miscast_template(miscasts.magic_miscasts_major)[0]
\ No newline at end of file
+    return _miscast_template(_major_miscasts, rng)[0]
+
+
+_tables = {'minor':    _minor_miscasts,
+           'major':    _major_miscasts,
+           'grimoire': _grimoire_miscasts}
+
+def roll_many(k : int, table : str = 'minor', rng=None) -> list:
+    """ Return the text of k miscasts rolled on the 'minor', 'major' or 'grimoire' table, e.g. for
+        simulations or listing several at once. Minor miscasts include rerolls and escalations.
+        Every roll uses rng (a random.Random) if given, otherwise the random module """
+    entries = _tables[table].draw(k, rng=rng)
+    texts = [_render(entry, rng) for entry in entries]
+    if table == 'minor':
+        # The escalations are rolled after all k results
+        texts = [_minor_escalations(text, entry.name, rng) for text, entry in zip(texts, entries)]
+
+    return texts
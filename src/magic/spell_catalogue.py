@@ -0,0 +1,136 @@
+import bisect
+import collections
+import re
+
+from ..magic4e import _cn_order, _magic_data, magic
+
+# A spell found in the catalogue. A spell in more than one lore is an entry for each lore
+#   name, lore - the spell name and the lore key
+#   spell      - the spell's data, as in spells.json. Don't change it!
+CatalogueSpell = collections.namedtuple('CatalogueSpell', ['name', 'lore', 'spell'])
+
+def _normalise(value) -> str:
+    """ Values are matched ignoring case and spacing, and 1 is the same as '1' """
+    return ' '.join(str(value).split()).casefold()
+
+def _source_key(source : str) -> str:
+    """ A single source as it's indexed, e.g. 'Corebook, p.240' is 'corebook p.240' and
+        'Corebook' is 'corebook'. Anything after the page, e.g. the name of an adventure, is
+        dropped """
+    source = ' '.join(_normalise(source).replace(',', ' ').split())
+    page = re.search(r'\bp\.?\s*(\d+)', source)
+    if page is None: return source
+    return ' '.join([source[:page.start()].strip(), f'p.{page.group(1)}']).strip()
+
+def _source_keys(source : str) -> set:
+    """ The keys a Source is indexed by. A Source can list several books separated by ';', and
+        each is indexed by the book and by the book with the page, e.g.
+        'Corebook, p.248; Winds of Magic, p.137' is 'corebook', 'corebook p.248',
+        'winds of magic' and 'winds of magic p.137' """
+    keys = set()
+    for part in source.split(';'):
+        key = _source_key(part)
+        if not key: continue
+        keys.add(key)
+        keys.add(re.sub(r'\s*p\.\d+$', '', key))
+    return keys
+
+class SpellCatalogue:
+    """ Every spell of every lore, indexed so that lookups like "CN 5 or less with a range of
+        Touch from any colour lore" intersect a few sets rather than scanning all the spells.
+
+        Each spell in a lore is an entry, numbered in the order of the data. There's an
+        inverted index (value: set of entries) for each of the fields, and the entries
+        sorted by CN so a range of CNs is a slice found by bisect
+    """
+    fields = ('Range', 'Target', 'Duration')
+
+    def __init__(self):
+        self._entries = tuple((name, lorekey) for lorekey, lore in _magic_data.items() for name in lore['spells'])
+
+        self._by_field = {field: dict() for field in self.fields}
+        self._by_source = dict()
+        self._by_lore   = dict()
+        self._by_name   = dict()
+        for entry, (name, lorekey) in enumerate(self._entries):
+            spell = _magic_data[lorekey]['spells'][name]
+            for field in self.fields:
+                if spell.get(field) is not None:
+                    self._by_field[field].setdefault(_normalise(spell[field]), set()).add(entry)
+            if spell.get('Source'):
+                for key in _source_keys(spell['Source']):
+                    self._by_source.setdefault(key, set()).add(entry)
+            self._by_lore.setdefault(lorekey, set()).add(entry)
+            self._by_name.setdefault(_normalise(name), set()).add(entry)
+
+        self._colour = frozenset(entry for lorekey, entries in self._by_lore.items() if _magic_data[lorekey].get('colour') == True
+                                       for entry in entries)
+
+        self._by_cn = sorted(range(len(self._entries)), key=lambda entry: self._cn(entry))
+        self._cns   = [self._cn(entry) for entry in self._by_cn]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _cn(self, entry : int) -> float:
+        name, lorekey = self._entries[entry]
+        return _cn_order(_magic_data[lorekey]['spells'][name]['CN'])
+
+    def _lore_entries(self, lore : str) -> set:
+        """ The entries of a lore, matched as by Magic4e, where 'all' is every colour lore """
+        lorekey = magic.canonise_lore(lore)
+        if lorekey is None: return set()
+        if lorekey == 'all': return self._colour
+        return self._by_lore.get(lorekey, set())
+
+    def _cn_entries(self, min_cn : int = None, max_cn : int = None) -> set:
+        lo = 0 if min_cn is None else bisect.bisect_left(self._cns, min_cn)
+        hi = len(self._cns) if max_cn is None else bisect.bisect_right(self._cns, max_cn)
+        return set(self._by_cn[lo:hi])
+
+    def values(self, field : str) -> list:
+        """ The distinct values of a field, as they're matched, e.g. for listing the ranges. The
+            values of 'Source' are the books """
+        if field == 'Source': return sorted(key for key in self._by_source if not re.search(r'p\.\d+', key))
+        return sorted(self._by_field[field])
+
+    def sources(self) -> list:
+        """ Every book and book with page the spells can be searched by """
+        return sorted(self._by_source)
+
+    def query(self, lore=None, name : str = None, min_cn : int = None, max_cn : int = None, source : str = None, **fields) -> list:
+        """ The spells matching every condition given, sorted by CN and then name
+              lore   - a lore name, as for Magic4e (so 'all' is the colour lores), or a list of them
+              name   - an exact spell name, ignoring case
+              min_cn, max_cn - the range of CN, spells with a CN which isn't a number are left
+                       out when there's a maximum
+              source - a book, e.g. 'Corebook', or a book and page, e.g. 'Corebook, p.240'
+              Range, Target, Duration - the value of the field, ignoring case
+            e.g. query(lore='all', max_cn=5, Range='Touch')
+        """
+        postings = []
+        if lore is not None:
+            lores = [lore] if isinstance(lore, str) else lore
+            postings.append(set().union(*[self._lore_entries(l) for l in lores]))
+        if name is not None:
+            postings.append(self._by_name.get(_normalise(name), set()))
+        if source is not None:
+            postings.append(self._by_source.get(_source_key(source), set()))
+        for field, value in fields.items():
+            if field not in self._by_field:
+                raise KeyError(f"Spells can't be searched by {field}, only by {', '.join(self.fields)}")
+            postings.append(self._by_field[field].get(_normalise(value), set()))
+
+        # Intersect the smallest sets first
+        postings.sort(key=len)
+        if min_cn is not None or max_cn is not None:
+            postings.append(self._cn_entries(min_cn, max_cn))
+
+        entries = set.intersection(*postings) if postings else set(range(len(self._entries)))
+        entries = sorted(entries, key=lambda entry: (self._cn(entry), self._entries[entry]))
+
+        return [CatalogueSpell(name, lorekey, _magic_data[lorekey]['spells'][name])
+                for name, lorekey in (self._entries[entry] for entry in entries)]
+
+
+spell_catalogue = SpellCatalogue()
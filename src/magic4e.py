@@ -1,18 +1,116 @@
+import bisect
 import collections, copy
 import json
 import importlib.resources
+import math
 import random
+import types
 from ..src.magic import miscast
 from typing import List
-from .utility.find_best_match import find_best_match
+from .utility.find_best_match import FuzzyIndex, did_you_mean
 
 from .. import data
 with importlib.resources.open_text(data,'spells.json') as f:
     _magic_data = json.load(f)
 
+with importlib.resources.open_text(data,'arcane_marks.json') as f:
+    # The arcane marks of each wind, formatted ready to show
+    _arcane_marks = types.MappingProxyType({wind: tuple(f"**{mark['title']}**: {mark['description']}" for mark in marks)
+                                            for wind, marks in json.load(f).items()})
+
+def _build_lore_aliases() -> dict:
+    """ Every name a lore can be known by (in lower case, as well as the lore keys themselves),
+        mapped to the lore key used in the data lookup """
+    all_lores = dict()
+    all_lores['all'] = 'all'
+    for lore in _magic_data:
+        #lorename = lore.lower().removeprefix('lore of')
+        lorename = lore.lower().strip()
+        if lorename.startswith('lore of'): lorename = lorename[8:].strip()
+
+        all_lores[lorename] = lore
+        all_lores[lore]     = lore
+
+        if 'names' in _magic_data[lore]:
+            for value in _magic_data[lore]['names'].values():
+                all_lores[value.lower()] = lore
+
+    return all_lores
+
+# Built once and shared, it never changes
+_lore_aliases = types.MappingProxyType(_build_lore_aliases())
+
+def _build_mark_winds() -> dict:
+    """ The wind whose arcane marks go with each lore key, for the lores which have any. A colour
+        lore goes by its wind, e.g. 'ulgu', and any other lore by its own name """
+    mark_winds = dict()
+    for lore, lore_data in _magic_data.items():
+        wind_name = lore_data.get('names', {}).get('wind') if lore_data.get('colour') == True else lore
+        if wind_name in _arcane_marks:
+            mark_winds[lore] = wind_name
+
+    return mark_winds
+
+# lore key: wind with arcane marks, see Magic4e._mark_wind()
+_mark_winds = types.MappingProxyType(_build_mark_winds())
+
+def _cn_order(cn) -> float:
+    """ The Casting Number to sort a spell by. A few are text, e.g. "Equal to the Beast's Wounds",
+        and those sort after every number """
+    if isinstance(cn, int): return cn
+    try:
+        return int(cn)
+    except ValueError:
+        return math.inf
+
+# The spells of a lore sorted by Casting Number, so the spells up to a maximum CN are the first
+# bisect_right(cns, max_cn) of them
+#   names - the spell names, sorted by CN and then by name
+#   cns   - the CN of each name, see _cn_order()
+#   alpha - the alphabetical rank of each name, for sorting a selection by name
+SpellIndex = collections.namedtuple('SpellIndex', ['names', 'cns', 'alpha'])
+
+def _build_spell_index(spells : dict) -> SpellIndex:
+    names = sorted(spells, key=lambda name: (_cn_order(spells[name]['CN']), name))
+    alpha = {name: rank for rank, name in enumerate(sorted(names))}
+    return SpellIndex(names=tuple(names),
+                      cns=tuple(_cn_order(spells[name]['CN']) for name in names),
+                      alpha=tuple(alpha[name] for name in names))
+
+def _build_colour_spells() -> dict:
+    """ The spells of all the colour lores together, which is the lore 'all' """
+    spells = dict()
+    for lore in _magic_data.values():
+        if lore.get('colour') == True:
+            spells.update(lore['spells'])
+    return spells
+
+def _build_spell_lores() -> dict:
+    """ The lores every spell appears in, in the order of the data """
+    spell_lores = dict()
+    for lorekey, lore in _magic_data.items():
+        for spell in lore['spells']:
+            spell_lores.setdefault(spell, []).append(lorekey)
+    return {spell: tuple(lores) for spell, lores in spell_lores.items()}
+
+# Built once and shared, they never change
+_colour_spells = types.MappingProxyType(_build_colour_spells())
+_spell_lores   = types.MappingProxyType(_build_spell_lores())
+
+# The result of matching a lore
+#   lore  - the lore key, or None if nothing matched
+#   error - a message for the user if nothing matched, otherwise None
+LoreMatch = collections.namedtuple('LoreMatch', ['lore', 'error'])
+
+# The result of choosing random spells
+#   spells - OrderedDict of spell name: spell, sorted by name
+#   error  - a message for the user if fewer spells were available than asked for, otherwise None
+RandomSpells = collections.namedtuple('RandomSpells', ['spells', 'error'])
+
 
 class Magic4e:
-    """ Class to contain all commands and related information for 4th ed lores, spells, and casting """
+    """ Class to contain all commands and related information for 4th ed lores, spells, and casting.
+        It has no state of its own, so one instance can serve any number of requests """
     class Lore:
         def __init__(self, lore : str):
             self._lore = lore
@@ -20,45 +118,40 @@ class Magic4e:
         def __getitem__(self, spellkey : str) -> dict:
             return dict(_magic_data[self._lore][spellkey])
 
-    def __init__(self):
-        self._error = None
-
-        self._all_lores = dict()
-        self._all_lores['all'] = 'all'
-        for lore in self.lores:
-            #lorename = lore.lower().removeprefix('lore of')
-            lorename = lore.lower().strip()
-            if lorename.startswith('lore of'): lorename = lorename[8:].strip()
-            #lorename = lore.lower().removeprefix('lore of')
-
-            self._all_lores[lorename] = lore
-            self._all_lores[lore]     = lore
+    _all_lores = _lore_aliases
 
-            if 'names' in _magic_data[lore]:
-                for value in _magic_data[lore]['names'].values():
-                    self._all_lores[value.lower()] = lore
+    # The lore names are the same for every instance, so they share one index
+    _lore_index = FuzzyIndex(_lore_aliases.keys())
 
-    @property
-    def error(self):
-        return self._error
+    # lore key: SpellIndex, built when first needed except for the merged colour lores
+    _spell_indexes = {'all': _build_spell_index(_colour_spells)}
 
     def _lore_best_match(self, lore : str) -> str:
-        """ Find the lore that best matches what was input """
+        """ Find the lore that best matches what was input, or None """
 
         if lore.lower() in self._all_lores:
-            lorekey = self._all_lores[lore.lower()]
-        else:
-            bm = find_best_match(lore, self._all_lores.keys())
-            if bm in self._all_lores:
-                lorekey = self._all_lores[bm]
-            else:
-                self._error = f"I don't know the lore {lore}"
-                return None
-        
-        return lorekey
+            return self._all_lores[lore.lower()]
+
+        bm = self._lore_index.best_match(lore)
+        return self._all_lores.get(bm)
+
+    def suggest_lores(self, lore : str, k : int = 3) -> List[str]:
+        """ Up to k lores which might be what was meant, best first, e.g. for 'did you mean' """
+        suggestions = self._lore_index.suggest(lore.lower(), k=len(self._all_lores))
+        lores = dict.fromkeys(self._all_lores[suggestion.option] for suggestion in suggestions)
+        return list(lores)[:k]
+
+    def match_lore(self, lore : str) -> LoreMatch:
+        """ The lore that best matches the input text, with an error for the user if none does """
+        lorekey = self._lore_best_match(lore)
+        if lorekey is None:
+            return LoreMatch(None, f"I don't know the lore {lore}." + did_you_mean(self.suggest_lores(lore)))
+
+        return LoreMatch(lorekey, None)
 
     def canonise_lore(self, lore):
-        """ Return the lore that best matches the input text, e.g. 'ulgu becomes "Lore of Shadows" """
+        """ Return the lore that best matches the input text, e.g. 'ulgu becomes "Lore of Shadows",
+            or None. See match_lore() for a message explaining why nothing matched """
 
         return self._lore_best_match(lore)
 
@@ -77,25 +170,43 @@ class Magic4e:
         lorekey = self._lore_best_match(lore)
         if not lorekey: raise KeyError(f"'{lore}' is not valid key for spells dictionary")
 
-        if lore.lower()!='all':
+        if lorekey != 'all':
             return dict(_magic_data[lorekey])
         else:
-            lores = {'spells':{}, 'colour':True}
-            for lore in _magic_data:
-                if 'colour' in self[lore] and self[lore]['colour'] == True:
-                    lores['spells'].update(self.spells(lore))
-            return lores
+            # The spells of every colour lore, merged once when loaded
+            return {'spells': _colour_spells, 'colour': True}
+
+    def _lore_spells(self, lorekey : str) -> dict:
+        """ The spells of a lore, straight from the data. Don't change them! """
+        if lorekey == 'all':
+            return _colour_spells
+        return _magic_data[lorekey]['spells']
+
+    def _spell_index(self, lorekey : str) -> SpellIndex:
+        index = self._spell_indexes.get(lorekey)
+        if index is None:
+            index = self._spell_indexes[lorekey] = _build_spell_index(self._lore_spells(lorekey))
+        return index
+
+    def _available_spells(self, lorekey : str, max_cn : int = None) -> int:
+        """ How many of the lore's spells, in the order of its SpellIndex, have a CN of no more than max_cn """
+        index = self._spell_index(lorekey)
+        if not max_cn: return len(index.names)
+        return bisect.bisect_right(index.cns, max_cn)
+
+    def _valid_lorekey(self, lore : str) -> str:
+        lorekey = self._lore_best_match(lore)
+        if not lorekey: raise KeyError(f"'{lore}' is not valid key for spells dictionary")
+        return lorekey
 
     def spells(self, lore : str, max_cn : int = None) -> dict:
         """ Get all the spells for the specified lore and maximum Casting Number (CN) """
-        spells = self[lore]['spells'] 
-
-        if max_cn:
-            for spell in spells.copy():
-                if spells[spell]['CN']>max_cn:
-                    spells.pop(spell)
+        lorekey = self._valid_lorekey(lore)
+        spells = self._lore_spells(lorekey)
+        if not max_cn: return dict(spells)
 
-        return dict(spells)
+        names = self._spell_index(lorekey).names[:self._available_spells(lorekey, max_cn)]
+        return {name: spells[name] for name in names}
 
     @property
     def lores(self) -> List[str]:
@@ -107,57 +218,72 @@ class Magic4e:
         """ Get a list of all the lores, including alternate names"""
         return list(self._all_lores.keys())
 
+    def spell_lores(self, spell : str) -> List[str]:
+        """ The lores with a spell, e.g. 'Beast Tongue' is in the Lore of Beasts and the Petty Lore of Tzeentch.
+            The spell name must be exact, an unknown spell has no lores """
+        return list(_spell_lores.get(spell, ()))
+
     def iscolour(self, lore : str) -> bool:
         """ Is this lore one of the colour magics? """
         return bool(self[lore]['colour'])
 
-    def get_random_spells(self, lore : str, request_spells : int, max_cn : int = None) -> dict:
+    def get_random_spells(self, lore : str, request_spells : int, max_cn : int = None, rng=None) -> dict:
         """ Get n random spells from a lore """
-        spells = self.spells(lore, max_cn)
-
-        number_available_spells = len(spells)
+        return self.random_spells(lore, request_spells, max_cn, rng).spells
+
+    def random_spells(self, lore : str, request_spells : int, max_cn : int = None, rng=None) -> RandomSpells:
+        """ Get n random spells from a lore, with a message for the user if there aren't that many.
+            The spells are drawn with rng (a random.Random) if given, otherwise the random module """
+        rng = rng or random
+        lorekey = self._valid_lorekey(lore)
+        index   = self._spell_index(lorekey)
+        error   = None
+
+        # The spells with a low enough CN are the start of the index, so choose from those positions
+        number_available_spells = self._available_spells(lorekey, max_cn)
         if request_spells > number_available_spells:
             request_spells = number_available_spells
-            canon_lore = self._lore_best_match(lore)
 
             max_cn_msg = ''
             if max_cn: max_cn_msg = f' with maximum CN of {max_cn}'
-            self._error = f'{canon_lore.title()} ({lore.title()}) has only {number_available_spells} spells{max_cn_msg}, listing all spells'
+            error = f'{lorekey.title()} ({lore.title()}) has only {number_available_spells} spells{max_cn_msg}, listing all spells'
 
-        random_spells = sorted(random.sample(list(spells), k=request_spells))
-        return collections.OrderedDict({key: spells[key] for key in random_spells})
+        chosen = sorted(rng.sample(range(number_available_spells), k=request_spells), key=index.alpha.__getitem__)
+        spells = self._lore_spells(lorekey)
+        return RandomSpells(collections.OrderedDict((index.names[i], spells[index.names[i]]) for i in chosen), error)
 
-    def miscast_minor(self) -> str:
+    def miscast_minor(self, rng=None) -> str:
         """ Return text describing a randomly rolled minor miscast. 
         
             Includes rerolls and escalations to major miscasts """
-        return miscast.miscast_minor()
+        return miscast.miscast_minor(rng)
 
-    def miscast_major(self) -> str:
+    def miscast_major(self, rng=None) -> str:
         """ Return text describing a randomly rolled major miscast."""
-        return miscast.miscast_major()
+        return miscast.miscast_major(rng)
 
-    def miscast_grimoire(self) -> str:
+    def miscast_grimoire(self, rng=None) -> str:
         """ Return text describing a randomly rolled grimoire miscast."""
-        return miscast.miscast_grimoire()        
+        return miscast.miscast_grimoire(rng)        
+
+    def _mark_wind(self, lore) -> str:
+        """ The wind whose arcane marks go with the lore, or None if there aren't any """
+        return _mark_winds.get(self._lore_best_match(lore))
 
-    def random_mark(self, lore) -> str:
+    def random_mark(self, lore, rng=None) -> str:
         """ Return text describing a randomly rolled arcane mark from the specified lore.
             Returns None if the lore has no associated arcane marks."""
-
-        # Load the JSON data about arcane marks
-        with importlib.resources.open_text(data,'arcane_marks.json') as f:
-            _marks_data = json.load(f)
-
-        try:
-            # Turn the lore into a wind name so we can do a lookup in the json
-            wind_name = self.get_wind_name(lore)
-            
-            # Choose a mark at random
-            mark = random.choices(_marks_data[wind_name], k=1)[0]
-        except KeyError:
-            # Either the wind name couldn't be identified, or there are no marks associated with this lore
+        marks = self.random_marks(lore, 1, rng)
+        return marks[0] if marks else None
+
+    def random_marks(self, lore, k : int, rng=None) -> List[str]:
+        """ Return k randomly rolled arcane marks from the specified lore, e.g. one for every
+            spell a wizard casts. Returns None if the lore has no associated arcane marks."""
+        wind_name = self._mark_wind(lore)
+        if wind_name is None:
             return None
 
-        # Return the result with some formatting
-        return f"**{mark['title']}**: {mark['description']}"
\ No newline at end of file
+        return (rng or random).choices(_arcane_marks[wind_name], k=k)
+
+# Shared by everything which needs lores or spells
+magic = Magic4e()
@@ -1,39 +1,54 @@
 import copy, json
 import importlib.resources
-import random
 
 from .. import data
+from .utility.weighted_table import WeightedTable
 with importlib.resources.open_text(data,'mutations.json') as f:
 #with open('C:\Development\Python\monarda_bot\data\mutations.json', 'r') as f:
     _mutations_data = json.load(f)
 
+def _prep_mutation_type(type):
+    mutations = {'any': {'mutation':[], 'k':[]}, 
+                 'khorne':   {'mutation':[], 'k':[]}, 
+                 'nurgle':   {'mutation':[], 'k':[]}, 
+                 'slaanesh': {'mutation':[], 'k':[]}, 
+                 'tzeentch': {'mutation':[], 'k':[]}
+                }
+
+    for mutation, probs in _mutations_data[type].items():
+        for k,v in probs.items():
+            mutations[k.lower()]['mutation'].append(mutation)
+            mutations[k.lower()]['k'].append(v)
+    
+    return {god: WeightedTable(table['mutation'], table['k']) for god, table in mutations.items()}
+
+_physical_mutations  = _prep_mutation_type('physical')
+_beast_head_mutation = _prep_mutation_type('beast head')
+_mental_mutations    = _prep_mutation_type('mental')
+_fixations           = WeightedTable(_mutations_data['fixations'].keys(), _mutations_data['fixations'].values())
+
 class Mutations4e:
     """ Class to contain all commands and related information for 4th ed mutations (Corebook, 183; 
         Enemy in Shadows Companion, Chapter 8) """
 
-    def __init__(self):
+                          # species: [physical, mental]
+    _species_prob_chart = {'elf':      [0, 100],
+                           'halfling': [10, 90],
+                           'human':    [50, 50],
+                           'dwarf':    [ 5, 95],
+                           'body':     [100, 0],
+                           'mind':     [0, 100],
+                           'physical': [100, 0],
+                           'mental':   [0, 100]
+                          }
+    _species_type_tables = {species: WeightedTable(['physical', 'mental'], probs) for species, probs in _species_prob_chart.items()}
 
-        self._physical_mutations  = self._prep_mutation_type('physical')
-        self._beast_head_mutation = self._prep_mutation_type('beast head')
-        self._mental_mutations    = self._prep_mutation_type('mental')
-        
-        self._fixations = {'mutation':list(_mutations_data['fixations'].keys()),
-                           'k':       list(_mutations_data['fixations'].values())}
-
-    def _prep_mutation_type(self, type):
-        mutations = {'any': {'mutation':[], 'k':[]}, 
-                     'khorne':   {'mutation':[], 'k':[]}, 
-                     'nurgle':   {'mutation':[], 'k':[]}, 
-                     'slaanesh': {'mutation':[], 'k':[]}, 
-                     'tzeentch': {'mutation':[], 'k':[]}
-                    }
-
-        for mutation, probs in _mutations_data[type].items():
-            for k,v in probs.items():
-                mutations[k.lower()]['mutation'].append(mutation)
-                mutations[k.lower()]['k'].append(v)
-        
-        return mutations
+    def __init__(self):
+        # The tables are only built once, on import
+        self._physical_mutations  = _physical_mutations
+        self._beast_head_mutation = _beast_head_mutation
+        self._mental_mutations    = _mental_mutations
+        self._fixations           = _fixations
 
 
     def physical(self, god='any'):
@@ -43,10 +58,10 @@ class Mutations4e:
 
         god = god.lower()
 
-        mutation = random.choices( self._physical_mutations[god]['mutation'], self._physical_mutations[god]['k'] )[0]
+        mutation = self._physical_mutations[god].draw()
 
         if (mutation=='Beast Head'):
-            head = random.choices(self._beast_head_mutation[god]['mutation'], self._beast_head_mutation[god]['k'])[0]
+            head = self._beast_head_mutation[god].draw()
             mutation = f'{mutation} ({head})'
 
         return mutation
@@ -58,7 +73,7 @@ class Mutations4e:
         
         god = god.lower()
 
-        mutation = random.choices( self._mental_mutations[god]['mutation'], self._mental_mutations[god]['k'] )[0]
+        mutation = self._mental_mutations[god].draw()
 
         if mutation == 'Terrible Phobia':
             mutation = f'{mutation} ({self.fixation()})'
@@ -66,7 +81,7 @@ class Mutations4e:
         return mutation
 
     def fixation(self):
-        return random.choices( self._fixations['mutation'], self._fixations['k'] )[0]
+        return self._fixations.draw()
 
     def mutation(self, species='human', god='any'):
         """ Returns a physical or mental mutation, randomly  determining the type based on the table on corebook
@@ -75,17 +90,7 @@ class Mutations4e:
         If the Chaos god is not specified, then 'any' will be used.
         """
 
-                            # species: [physical, mental]
-        species_prob_chart = {'elf':      [0, 100],
-                              'halfling': [10, 90],
-                              'human':    [50, 50],
-                              'dwarf':    [ 5, 95],
-                              'body':     [100, 0],
-                              'mind':     [0, 100],
-                              'physical': [100, 0],
-                              'mental':   [0, 100]
-                             } 
-        type = random.choices( ['physical', 'mental'], species_prob_chart[species])[0]
+        type = self._species_type_tables[species].draw()
         if type=='physical':
             return self.physical(god)
         else: 
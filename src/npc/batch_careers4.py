@@ -0,0 +1,153 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .career_table4 import career_table
+from .randomNPC4 import RandomNPC4
+
+class CareerPaths4:
+    """ A batch of simulated career histories, stored as compact arrays.
+
+        ids[i, :lengths[i]] and ranks[i, :lengths[i]] are the career ids (indices into
+        careers) and ranks of the i-th career history. Any history can be turned back into
+        a list of (career, rank) or replayed into a full NPC when needed.
+    """
+
+    def __init__(self, species, young, careers, ids, ranks, lengths):
+        self.species = species
+        self.young   = young
+        self.careers = careers
+        self.ids     = ids
+        self.ranks   = ranks
+        self.lengths = lengths
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def history(self, i) -> list:
+        """ The i-th career history as a list of (career, rank) """
+        length = self.lengths[i]
+        return [(self.careers[c], int(r)) for c, r in zip(self.ids[i, :length], self.ranks[i, :length])]
+
+    def final_careers(self):
+        """ The career id and rank each history finished in, as two arrays """
+        rows = np.arange(len(self))
+        return self.ids[rows, self.lengths-1], self.ranks[rows, self.lengths-1]
+
+    def replay(self, i, **kwargs) -> RandomNPC4:
+        """ Build the full NPC for the i-th career history. Any keyword arguments (lore,
+            characteristics, etc.) are passed on to RandomNPC4 """
+        npc = RandomNPC4(species=self.species, young=self.young, init_only=True, **kwargs)
+        for career, rank in self.history(i):
+            npc.add_career_rank(career, rank)
+
+        return npc
+
+
+def _segment_table(groups, weights):
+    """ Pack one cumulative table per group into a single sorted array. Group g's table is
+        offset by g, so a draw for a row in group g is searchsorted(table, g + u) for
+        u in [0, 1). Returns the table, the career id at each position and whether each group
+        has anything to draw """
+    table, ids, has_any = [], [], []
+    for g, candidates in enumerate(groups):
+        total = sum(weights[c] for c in candidates)
+        has_any.append(total > 0)
+        if total <= 0: continue
+
+        cumulative = 0
+        for c in candidates:
+            cumulative += weights[c]
+            table.append(g + cumulative/total)
+            ids.append(c)
+        table[-1] = g + 1.0 # Make sure rounding can't leave a gap at the end
+
+    return np.array(table), np.array(ids, dtype=np.int16), np.array(has_any)
+
+
+def simulate_careers(species : str, n : int, young : bool = False, starting_career : tuple = None,
+                     force_first : bool = False, seed=None) -> CareerPaths4:
+    """ Simulate n career histories at once with the same rules as RandomNPC4._add_random_careers.
+
+        All n histories are advanced together, one dice roll each per step, with the career
+        changes drawn from precomputed cumulative tables. starting_career is an optional
+        (career, rank), otherwise the first career is random. Needs numpy.
+    """
+    if np is None:
+        raise ImportError('simulate_careers needs numpy')
+
+    species = career_table.check_species(species)
+    rng = np.random.default_rng(seed)
+    die = 8 if young else 6
+
+    careers = career_table.careers
+    classes = list(career_table.careers_by_class)
+    class_of = np.array([classes.index(career_table.career_class[c]) for c in careers], dtype=np.int16)
+    first_weights = career_table.weights(species, firstcareer=True)
+    later_weights = career_table.weights(species, firstcareer=False)
+
+    same_groups  = [[career_table.index[x] for x in career_table.careers_by_class[career_table.career_class[c]] if x!=c] for c in careers]
+    other_groups = [[i for i, c in enumerate(careers) if career_table.career_class[c]!=classname] for classname in classes]
+    same_table,  same_ids,  has_same  = _segment_table(same_groups, later_weights)
+    other_table, other_ids, has_other = _segment_table(other_groups, later_weights)
+
+    # The first career
+    if starting_career:
+        career = np.full(n, career_table.index[starting_career[0].title()], dtype=np.int16)
+        rank   = np.full(n, starting_career[1], dtype=np.int8)
+    else:
+        start_table, start_ids, _ = _segment_table([range(len(careers))], first_weights)
+        career = start_ids[np.searchsorted(start_table, rng.random(n), side='right')]
+        rank   = np.ones(n, dtype=np.int8)
+
+    width = 16
+    ids     = np.zeros((n, width), dtype=np.int16)
+    ranks   = np.zeros((n, width), dtype=np.int8)
+    lengths = np.ones(n, dtype=np.int32)
+    ids[:, 0]   = career
+    ranks[:, 0] = rank
+
+    alive = np.arange(n)
+    first = np.full(n, force_first)
+    while alive.size:
+        if lengths[alive].max() >= width:
+            # Rare long histories, so double the room
+            ids   = np.concatenate([ids, np.zeros_like(ids)], axis=1)
+            ranks = np.concatenate([ranks, np.zeros_like(ranks)], axis=1)
+            width *= 2
+
+        val = rng.integers(1, np.where(first[alive], 4, die)+1)
+
+        c = career[alive]
+        r = rank[alive]
+        up    = val <= 2
+        same  = (val == 3) & has_same[c]
+        other = (val == 4) & has_other[class_of[c]]
+        stop  = (val > 4) | (up & (r == 4))
+        up   &= r < 4
+
+        # Rerolls (a class change with nowhere to go) do nothing, not even use up force_first
+        first[alive[up | same | other | stop]] = False
+
+        r = np.where(up, r+1, r)
+        stop |= up & (r == 4)   # Stop once we've gone up to the max career rank
+        r = np.where(other, 1, r).astype(np.int8)
+
+        idx = np.flatnonzero(same)
+        c[idx] = same_ids[np.searchsorted(same_table, c[idx] + rng.random(idx.size), side='right')]
+        idx = np.flatnonzero(other)
+        c[idx] = other_ids[np.searchsorted(other_table, class_of[c[idx]] + rng.random(idx.size), side='right')]
+
+        career[alive] = c
+        rank[alive]   = r
+
+        added = alive[up | same | other]
+        ids[added, lengths[added]]   = career[added]
+        ranks[added, lengths[added]] = rank[added]
+        lengths[added] += 1
+
+        alive = alive[~stop]
+
+    width = lengths.max()
+    return CareerPaths4(species, young, careers, ids[:, :width], ranks[:, :width], lengths)
@@ -6,22 +6,36 @@ from math import inf
 
 from ...data import bot_char_dat
 from ...data.bestiary import *
-from ..magic4e import Magic4e
-from ..utility.find_best_match import find_best_match
+from ..magic4e import magic
 from .careers4 import Careers4
 from .skills4 import Skills4
 from .talents4 import Talents4
 
 
+# XP cost per advance, in blocks of five advances
+characteristic_advance_costs = [25,30,40,50,70,90,120,150,190,230,280,330,390,450,520,590,670,750,840,930]
+skill_advance_costs          = [10,15,20,30,40,60,80,110,140,180,220,270,320,380,440,510,580,660,740]
+
+def advance_xp(advances : int, costs : list, free_advances : int = 0) -> int:
+    """XP to take a characteristic or skill from free_advances to advances"""
+    xp = 0
+    for i in range(advances, free_advances,-1):
+        xp += costs[int((i-1) / 5)]
+
+    return xp
+
+
 class BuildNPC4:
     """Generate and manage a 4th Edition NPC"""
 
     def __init__(self, species : str, lore : str = None,
                  characteristics=None, starting_skills=None, starting_talents=None, starting_trappings=None,
-                 randomise=True):
+                 randomise=True, seed=None, rng=None):
 
-        # initialise random number generator with OS (or time) seed
-        random.seed()
+        # The NPC's own random number generator, from the seed given, otherwise OS (or time) seed.
+        # Every random choice for the NPC uses it, so the same seed always gives the same NPC
+        self._rng  = random.Random(seed) if rng is None else rng
+        self._seed = seed
 
         # For now we assume if we don't know the species it's a type of human unless contains
         # one of the known species words (i.e. dwarf, halfing, elf or gnome)
@@ -63,9 +77,9 @@ class BuildNPC4:
                 for stat,value in base_characteristics.items():
                     if stat!="M":
                         if value>=10:
-                            base_characteristics[stat] = (value - 10) + random.randint(1,10) + random.randint(1,10)
+                            base_characteristics[stat] = (value - 10) + self._rng.randint(1,10) + self._rng.randint(1,10)
                         else:
-                            base_characteristics[stat] = random.randint(1,10)
+                            base_characteristics[stat] = self._rng.randint(1,10)
 
             self._base_characteristics  = base_characteristics
             self._characteristics       = dict(base_characteristics)
@@ -96,10 +110,49 @@ class BuildNPC4:
         self._trappings         = set()
 
         self._lore              = lore
-        self._spells            = {}
+        self._spells            = None                  # Chosen when first needed
         
         self._xp_spend          = 0
 
+    # The state needed to restore an NPC without rebuilding it, see to_dict(). Sets are stored
+    # as sorted lists, the spells as lists in the order chosen, and the career history as
+    # [career, rank] pairs
+    _state_fields = ('species', 'index_species', 'seed', 'lore',
+                     'base_characteristics', 'starting_characteristics', 'characteristics',
+                     'starting_skills', 'skills', 'careers_taken', 'career_history')
+    _state_sets   = ('traits', 'optional_traits', 'starting_talents', 'starting_trappings',
+                     'suggested_talents', 'talents', 'trappings')
+
+    def to_dict(self) -> dict:
+        """The NPC's inputs and resolved choices (career history, skills, talents, etc.) as a
+           dictionary of JSON compatible types. Rendered output is not included"""
+        self.choose_spells()  # Choose the spells now, not differently after restoring
+
+        state = {field: getattr(self, f'_{field}') for field in self._state_fields}
+        state['starting_skills'] = dict(self._starting_skills) if self._starting_skills else {}
+        state['career_history']  = [list(careerrank) for careerrank in self._career_history]
+        state.update({field: sorted(getattr(self, f'_{field}')) for field in self._state_sets})
+        state['spells'] = None if self._spells is None else {spell_list: list(spells) for spell_list, spells in self._spells.items()}
+        state['xp_spend'] = self._xp_spend
+
+        return state
+
+    @classmethod
+    def from_dict(cls, state : dict):
+        """Restore an NPC from to_dict() without replaying its career history"""
+        npc = cls.__new__(cls)
+        for field in cls._state_fields:
+            setattr(npc, f'_{field}', state[field])
+        for field in cls._state_sets:
+            setattr(npc, f'_{field}', set(state[field]))
+
+        npc._career_history = collections.deque(tuple(careerrank) for careerrank in state['career_history'])
+        npc._spells   = None if state['spells'] is None else {spell_list: dict.fromkeys(spells) for spell_list, spells in state['spells'].items()}
+        npc._xp_spend = state['xp_spend']
+        npc._rng      = random.Random(npc._seed)
+
+        return npc
+
     @classmethod
     def known_species(cls) -> list:
         """List known species. Most useful for listing 'monsters' that can have careers applied."""
@@ -110,38 +163,9 @@ class BuildNPC4:
         return species_default_playable
 
     def __str__(self) -> str:
-        retstr = ''
-        # Species and most recent career level name
-        if self._career_history:
-            lastcareer, lastrank = next(reversed(self._career_history))
-            lastcareername = Careers4()[lastcareer][f'rank {lastrank}']['name']
-
-            retstr  = self._species.title() + " " + lastcareername + '\n'
-            retstr += 'Career history: ' + str(self.career_history) + '\n'
-
-        # Characteristics
-        retstr += str(self.characteristics) + '\n'
-
-        # Skills       
-        retstr += "Skills: " 
-        for key, values in self.skills_verbose.items():
-            for value in values:
-                retstr += "{} {} [{}+{}], ".format(key, value['total'], value['characteristic'], value['add'])
-        retstr += '\n'
-
-        # Talents
-        if self.talents_initial:
-            retstr += "Starting Talents:  " + str(self.talents_initial) + "\n"
-        retstr += "Suggested Talents: " + str(self.talents_suggested) + "\n"
-        retstr += "Additional Talents: " + str(self.talents_additional) + "\n"
-
-        # Traits
-        retstr += 'Traits: ' + str(self.traits) + '\n'
-        retstr += 'Optional Traits: ' + str(self.optional_traits) + '\n'
+        from .render_npc4 import render  # Not at the top, render_npc4 needs this module
 
-        # Trappings
-        retstr += "Trappings: " + str(self.trappings) + "\n"
-        retstr += "Additional Trappings: " + str(self.additional_trappings) + "\n"
+        retstr = render(self, 'text')
 
         # Verbose
         retstr += "\n\nTalents by Career: " + str(self.talents_by_career) + "\n"
@@ -438,7 +462,6 @@ class BuildNPC4:
            (if any), and the calculated max times the talent may be taken (usually 
            based on a characterisic bonus).
         """
-        self._check_lore()
         return self.__template_gettalents(set(self._talents) + self._starting_talents)
 
     @property
@@ -487,7 +510,6 @@ class BuildNPC4:
         # We don't remove starting talents from the list, because career talents can potentially 
         # be taken multiple times without needing GM approval. Though since this is an NPC the
         # GM could probably approve!
-        self._check_lore()
         return self.__template_gettalents(self._suggested_talents)
 
     @property
@@ -590,7 +612,6 @@ class BuildNPC4:
            but general skills with an (Any) may need to be recorded seperately
            in which case the result could be {"Melee (Any)":[55, 44]}
         """
-        self._check_lore()
         return self.__template_skills(verbose=False)
 
     @property
@@ -601,7 +622,6 @@ class BuildNPC4:
             "add" : int is what is added to the characteristic to get the skill total,
             "source" : str is the source career and rank (e.g. 'Scholar 2')
         """
-        self._check_lore()
         return self.__template_skills(verbose=True)
 
     @property
@@ -611,29 +631,17 @@ class BuildNPC4:
         xp = max(100 * (len(self.career_history)-1),0)
 
         # Characteristics
-        characteristic_advance_costs = [25,30,40,50,70,90,120,150,190,230,280,330,390,450,520,590,670,750,840,930]
         for char,value in self._characteristics.items():
-            advance_to_cost = value - self._starting_characteristics[char]
-
-            for i in range(advance_to_cost, 0,-1):
-                sac_idx = int((i-1) / 5)
-
-                xp += characteristic_advance_costs[sac_idx]
+            xp += advance_xp(value - self._starting_characteristics[char], characteristic_advance_costs)
         
         # Skills
-        skill_advance_costs = [10,15,20,30,40,60,80,110,140,180,220,270,320,380,440,510,580,660,740]
         for skill,value in self._skills.items():
-            advance_to_cost = value
-
             if skill in self._starting_skills:
                 advances_no_cost = self._starting_skills[skill]
             else:
                 advances_no_cost = 0
         
-            for i in range(advance_to_cost, advances_no_cost,-1):
-                sac_idx = int((i-1) / 5)
-
-                xp += skill_advance_costs[sac_idx]
+            xp += advance_xp(value, skill_advance_costs, advances_no_cost)
 
         # Talents
         xp += 100 * len(self.talents_suggested)
@@ -652,6 +660,8 @@ class BuildNPC4:
         except KeyError:
             raise KeyError(f"{careername} is not a valid career name")
 
+        self._spells = None # The career history is changing so the spells may change too
+
         # Check if we've been in this career before. Only update the NPC if 
         # we haven't been in this career before or only at a lower rank
         # We thus support something slightly odd like `soldier 1 soldier 3`
@@ -689,35 +699,58 @@ class BuildNPC4:
             # We only need to add new talents if we've not been in this rank before
             # (Remember we visit ranks multiple times to up skills and characteristics)
             if i==rank:
-                # Update the list of suggested talents, but don't add any more that can only be taken once
-                onetakers = set()
-                for talentname in (self._suggested_talents.union(self._starting_talents)):
-                    try:
-                        talent_info = Talents4()[talentname]
-                        if isinstance(talent_info['max'],int) and talent_info['max']==1:
-                            onetakers.update([talentname])
-                    except KeyError:
-                        pass    # Ignore key errors, they ought to come from talent group issues
-
-                modified_suggested_talents = set(careerrank['npc_suggested_talents']) - onetakers
-                modified_available_talents = list(set(careerrank['talents']) - onetakers)
-                
-                # If there are no suggested talents then we're still required to pick one talent per rank
-                # And sometimes the suggested talent is from an earlier career rank
-                # So we pick a random talent from those that are valid
-                if not modified_suggested_talents or not set(modified_available_talents).intersection(modified_suggested_talents):
-                    self._suggested_talents.update(random.choices(modified_available_talents))
-
-                if modified_suggested_talents:
-                    self._suggested_talents.update(modified_suggested_talents)
-
-                # And update the list of all available talents
-                self._talents.update(modified_available_talents)
+                self._add_rank_talents(careername, rank)
 
         # Update career history
         self._careers_taken[careername] = rank
         self._career_history.append((careername,rank))
 
+        # Name any new skills and talents for any colour of magic now, not when they're read
+        self._check_lore()
+
+
+    def _add_rank_talents(self, careername, rank) -> None:
+        """Update the suggested and available talents for a newly taken career rank"""
+        careerrank = Careers4()[careername][f'rank {rank}']
+
+        # Update the list of suggested talents, but don't add any more that can only be taken once
+        onetakers = set()
+        for talentname in (self._suggested_talents.union(self._starting_talents)):
+            try:
+                talent_info = Talents4()[talentname]
+                if isinstance(talent_info['max'],int) and talent_info['max']==1:
+                    onetakers.update([talentname])
+            except KeyError:
+                pass    # Ignore key errors, they ought to come from talent group issues
+
+        modified_suggested_talents = set(careerrank['npc_suggested_talents']) - onetakers
+        modified_available_talents = sorted(set(careerrank['talents']) - onetakers)
+        
+        # If there are no suggested talents then we're still required to pick one talent per rank
+        # And sometimes the suggested talent is from an earlier career rank
+        # So we pick a random talent from those that are valid
+        if not modified_suggested_talents or not set(modified_available_talents).intersection(modified_suggested_talents):
+            self._suggested_talents.update(self._rng.choices(modified_available_talents))
+
+        if modified_suggested_talents:
+            self._suggested_talents.update(modified_suggested_talents)
+
+        # And update the list of all available talents
+        self._talents.update(modified_available_talents)
+
+    def reroll_talents(self) -> None:
+        """Choose the suggested talents again. Only the talent choices are replayed over the
+           career history, nothing else about the NPC changes"""
+        self._suggested_talents = set()
+        self._talents           = set()
+
+        taken = {}
+        for careername, rank in self._career_history:
+            if rank > taken.get(careername, 0):
+                self._add_rank_talents(careername, rank)
+                taken[careername] = rank
+
+        self._check_lore()
 
     def add_career(self, careername, rank) -> None:
         """ Utility function to apply all career ranks up to the specified one to an NPC.
@@ -740,17 +773,20 @@ class BuildNPC4:
             self._skills[skill] = value
 
 
-    def _check_lore(self):
+    def _check_lore(self, choose : bool = False):
+        """Name the skills and talents for any colour of magic after the NPC's lore. If the NPC
+           has none, a random lore is chosen when one is needed, or when choose is True"""
+        needs_lore = ('Channelling (Any Colour)' in self._skills or
+                      'Arcane Magic (Any Arcane Lore)' in self._suggested_talents or
+                      'Arcane Magic (Any Arcane Lore)' in self._talents)
+
         if self._lore == None:# and 'Wizard' in self._careers_taken.keys():
-            self._lore = random.choice(['Lore of Beasts', 'Lore of Death', 'Lore of Fire',
+            if not (needs_lore or choose): return
+            self._lore = self._rng.choice(['Lore of Beasts', 'Lore of Death', 'Lore of Fire',
                                         'Lore of Heavens', 'Lore of Life', 'Lore of Light', 
                                         'Lore of Metal', 'Lore of Shadows'])
 
-        m4 = Magic4e()
-        if 'names' in m4[self._lore]:
-            wind_name = m4[self._lore]['names']['wind']
-        else:
-            wind_name = self._lore.title()
+        wind_name = self._wind_name(self._lore)
 
         if 'Channelling (Any Colour)' in self._skills:
             self._skills[f'Channelling ({wind_name})'] = self._skills.pop('Channelling (Any Colour)')
@@ -764,22 +800,76 @@ class BuildNPC4:
             self._talents.remove('Arcane Magic (Any Arcane Lore)')
 
 
+    @staticmethod
+    def _wind_name(lore) -> str:
+        """The name of the wind of magic used for a lore, e.g. 'Ghur' for the Lore of Beasts"""
+        lore_data = magic[lore]
+        lorekey   = magic.canonise_lore(lore)
+        if 'names' in lore_data:
+            return lore_data['names']['wind']
+        else:
+            return lorekey.title()
+
+    def set_lore(self, lore) -> None:
+        """Change the NPC's lore. Skills and talents named after the old wind are renamed for
+           the new one, and the spells will be chosen again. Raises ValueError for an unknown
+           lore, leaving the NPC as it was"""
+        # Resolve the new lore before changing anything
+        match = magic.match_lore(lore)
+        if match.error: raise ValueError(match.error)
+        new_wind = self._wind_name(match.lore)
+
+        if self._lore is not None:
+            old_wind = self._wind_name(self._lore)
+
+            if f'Channelling ({old_wind})' in self._skills:
+                self._skills[f'Channelling ({new_wind})'] = self._skills.pop(f'Channelling ({old_wind})')
+
+            for talents in (self._suggested_talents, self._talents):
+                if f'Arcane Magic ({old_wind})' in talents:
+                    talents.remove(f'Arcane Magic ({old_wind})')
+                    talents.add(f'Arcane Magic ({new_wind})')
+
+        self._lore = match.lore
+        self._check_lore()
+        self._spells = None
+
+    def set_characteristics(self, characteristics : dict) -> None:
+        """Change some or all of the NPC's starting characteristics, e.g. {'WS': 50}, keeping the
+           advances from its careers and any stat modifying starting talents. Raises ValueError
+           for characteristics the NPC doesn't have, leaving the NPC as it was"""
+        unknown = [k for k in characteristics if k not in self._base_characteristics]
+        if unknown:
+            raise ValueError(f"Unknown characteristics {', '.join(unknown)}, expected {', '.join(self._base_characteristics)}")
+        characteristics = {**self._base_characteristics, **characteristics}
+        talent_mods = {k: self._starting_characteristics[k] - self._base_characteristics[k] for k in self._base_characteristics}
+        advances    = {k: self._characteristics[k] - self._starting_characteristics[k] for k in self._starting_characteristics}
+
+        self._base_characteristics     = characteristics
+        self._starting_characteristics = {k: v + talent_mods.get(k, 0) for k, v in characteristics.items()}
+        self._characteristics          = {k: v + advances.get(k, 0) for k, v in self._starting_characteristics.items()}
+
+    def reroll_spells(self) -> None:
+        """Forget the spells chosen, so they'll be chosen again when next needed"""
+        self._spells = None
+
     def _choose_spells(self, spell_lists):
         # Remove any lores which are already at max spells
         if 'Arcane Lore (Any)' in spell_lists:
+            self._check_lore(choose=True)
             spell_lists.append(self._lore)
             spell_lists.remove('Arcane Lore (Any)')
 
         #choose four spells from the available lists. First thing is to distribute them
-        spells_from = random.choices(spell_lists, k=4)
+        spells_from = self._rng.choices(spell_lists, k=4)
 
+        # The spells of each list are kept in the order they were chosen, as dict keys
         for item in spells_from:
             if item not in self._spells:
-                self._spells[item] = set()
+                self._spells[item] = dict()
 
-        m4 = Magic4e()
         for k,v in Counter(spells_from).items():
-            self._spells[k].update( m4.get_random_spells(k.lower(),v).keys() )
+            self._spells[k].update( dict.fromkeys(magic.get_random_spells(k.lower(),v, rng=self._rng)) )
 
 
     def _format_spells(self):
@@ -790,18 +880,30 @@ class BuildNPC4:
         return formatted_text.strip()
 
 
+    def choose_spells(self) -> dict:
+        """Choose the spells, unless they've been chosen since the careers or lore last changed.
+           Returns the spells chosen, see chosen_spells"""
+        if self._spells is None:
+            self._spells = {}
+
+            # Scan through the careers in the history and find each that has a spell-list associated with it
+            for career in dict.fromkeys(self._career_history):
+                careerrank = Careers4()[career[0]][f'rank {career[1]}']
+                if 'spell-lists' in careerrank:
+                    spell_lists = careerrank['spell-lists'].copy()
+                    self._choose_spells(spell_lists)
+
+        return self.chosen_spells
+
     @property
-    def spells(self):
-        # Reset the spells in case this has been called before
-        self._spells = {}
-
-        # Scan through the careers in the history and find each that has a spell-list associated with it
-        spells = []
-        uch = set(self._career_history)
-        for career in uch:
-            careerrank = Careers4()[career[0]][f'rank {career[1]}']
-            if 'spell-lists' in careerrank:
-                spell_lists = careerrank['spell-lists'].copy()
-                self._choose_spells(spell_lists)
+    def chosen_spells(self) -> dict:
+        """The spells chosen so far as {spell list: [spells]}, without choosing any. This is empty
+           until choose_spells() is called, or the spells are read"""
+        if self._spells is None: return {}
+        return {spell_list: list(spells) for spell_list, spells in self._spells.items()}
 
+    @property
+    def spells(self):
+        # Spells are chosen once, when first needed. See reroll_spells()
+        self.choose_spells()
         return self._format_spells()
@@ -0,0 +1,356 @@
+import collections
+import functools
+import random
+
+from .buildNPC4 import advance_xp, characteristic_advance_costs, skill_advance_costs
+from .career_table4 import career_table
+from .careers4 import _careers_data
+
+# The result of running the chain to completion. All values are exact (up to the tolerance
+# the chain is run to) rather than sampled
+#   final   - probability of the career history ending in each (career, rank)
+#   lengths - probability of each career history length, indexed by length
+#   visits  - expected number of times each (career, rank) appears in the career history
+#   xp      - expected XP spend, see CareerChain4.state_xp()
+ChainResult = collections.namedtuple('ChainResult', ['final', 'lengths', 'visits', 'xp'])
+
+
+@functools.lru_cache(maxsize=None)
+def _state_xp(careername : str, rank : int) -> int:
+    """ Estimated XP for one entry in a career history: the career change, the suggested
+        talent(s), and the characteristic and skill advances of going up to this rank
+        from the rank below """
+    def _advances(rank):
+        # Taking ranks 1 to rank one after another applies every rank's advances again
+        chars  = collections.Counter()
+        skills = collections.Counter()
+        for taken in range(1, rank+1):
+            for i in range(1, taken+1):
+                careerrank = _careers_data[careername][f'rank {i}']
+                chars.update(careerrank['advances'])
+                skills.update(skill.replace("(Any)",f"([{careername} {i}])") for skill in careerrank['skills'])
+
+        return sum(advance_xp(5*n, characteristic_advance_costs) for n in chars.values()) \
+             + sum(advance_xp(5*n, skill_advance_costs) for n in skills.values())
+
+    careerrank = _careers_data[careername][f'rank {rank}']
+    suggested = set(careerrank['npc_suggested_talents'])
+    talents = len(suggested) if suggested.intersection(careerrank['talents']) else len(suggested)+1
+
+    return 100 + 100*talents + _advances(rank) - _advances(rank-1)
+
+
+class CareerChain4:
+    """ The random career progression of RandomNPC4._add_random_careers as an absorbing Markov chain.
+
+        The states are (career, rank). Each roll of the die (a d6, or a d8 if young) gives
+          1-2: up a rank (reaching rank 4 ends the career history)
+          3:   a different career in the same class, at the same rank
+          4:   a career in another class, at rank 1
+          5+:  stop
+        with careers weighted by the species' later career weights. If there is no career
+        to change to then the roll is rerolled.
+
+        Distributions of the final career and rank, the career history length and expected
+        XP are calculated exactly rather than by generating NPCs.
+    """
+
+    def __init__(self, species : str, young : bool = False, tolerance : float = 1e-12):
+        self.species = career_table.check_species(species)
+        self.young = young
+        self.die = 8 if young else 6
+        self.tolerance = tolerance
+
+        careers = career_table.careers
+        first_weights = career_table.weights(self.species, firstcareer=True)
+        later_weights = career_table.weights(self.species, firstcareer=False)
+
+        def _normalised(candidates):
+            total = sum(later_weights[career_table.index[c]] for c in candidates)
+            if total <= 0: return []
+            return [(c, later_weights[career_table.index[c]]/total) for c in candidates if later_weights[career_table.index[c]] > 0]
+
+        # Where a same class or other class change can go, and with what probability
+        self._same = {careername: _normalised([c for c in career_table.careers_by_class[career_table.career_class[careername]] if c!=careername])
+                      for careername in careers}
+        self._other = {classname: _normalised([c for c in careers if career_table.career_class[c]!=classname])
+                       for classname in career_table.careers_by_class}
+
+        first_total = sum(first_weights)
+        self._start = {(c, 1): w/first_total for c, w in zip(careers, first_weights) if w > 0}
+
+        self.states = tuple((c, rank) for c in careers for rank in range(1,5))
+        self._results = dict()
+        self._reach = dict()
+        self._roll = dict()
+
+    def roll_probabilities(self, state : tuple, die : int = None) -> dict:
+        """ The probabilities of going 'up' a rank, changing to the 'same' class, changing
+            to an 'other' class, or to 'stop', once rerolls are taken into account """
+        die = die or self.die
+        careername, rank = state
+        if (careername, die) not in self._roll:
+            probs = {'up':    2/die,
+                     'same':  1/die if self._same[careername] else 0,
+                     'other': 1/die if self._other[career_table.career_class[careername]] else 0,
+                     'stop':  (die-4)/die}
+
+            total = sum(probs.values())
+            self._roll[(careername, die)] = {k: v/total for k, v in probs.items()}
+
+        return self._roll[(careername, die)]
+
+    def start_distribution(self) -> dict:
+        """ Probability of each first career (at rank 1) """
+        return dict(self._start)
+
+    def transitions(self, state : tuple, die : int = None) -> dict:
+        """ One row of the transition matrix. Keys are the next (career, rank), or ('end', (career, rank))
+            when the career history ends in that career and rank """
+        careername, rank = state
+        probs = self.roll_probabilities(state, die)
+
+        row = collections.defaultdict(float)
+        if rank < 3:
+            row[(careername, rank+1)] += probs['up']
+        else:
+            row[('end', (careername, 4))] += probs['up']
+
+        for c, q in self._same[careername]:
+            row[(c, rank)] += probs['same']*q
+
+        for c, q in self._other[career_table.career_class[careername]]:
+            row[(c, 1)] += probs['other']*q
+
+        row[('end', state)] += probs['stop']
+
+        return dict(row)
+
+    def transition_matrix(self, die : int = None) -> dict:
+        """ The full (sparse) transition matrix as a dictionary of rows, see transitions() """
+        return {state: self.transitions(state, die) for state in self.states}
+
+    @classmethod
+    def state_xp(cls, state : tuple) -> int:
+        """ Estimated XP of a single career history entry. This is an estimate because the XP
+            actually spent depends on the whole history, e.g. advances already taken in
+            other careers, or revisiting a career """
+        return _state_xp(*state)
+
+    def run(self, start : tuple = None, force_first : bool = False) -> ChainResult:
+        """ Run the chain from the start state, or from a random first career if start is None,
+            until the probability of still being in a career is below the tolerance.
+
+            force_first uses a d4 for the first roll, as NPC4e does, so that the career history
+            can't end immediately """
+        key = (start, force_first)
+        if key in self._results:
+            return self._results[key]
+
+        if start is None:
+            mass = dict(self._start)
+        else:
+            mass = {(start[0].title(), start[1]): 1.0}
+
+        final   = collections.defaultdict(float)
+        lengths = [0.0]
+        visits  = collections.defaultdict(float)
+        for state, p in mass.items():
+            visits[state] += p
+
+        die = 4 if force_first else self.die
+        length = 1
+        while sum(mass.values()) > self.tolerance:
+            while len(lengths) < length+2:
+                lengths.append(0.0)
+            new_mass = collections.defaultdict(float)
+            other_mass = collections.defaultdict(float)
+            for state, p in mass.items():
+                careername, rank = state
+                probs = self.roll_probabilities(state, die)
+
+                # Up a rank, possibly ending at rank 4
+                if rank < 3:
+                    new_mass[(careername, rank+1)] += p*probs['up']
+                elif rank == 3:
+                    final[(careername, 4)] += p*probs['up']
+                    visits[(careername, 4)] += p*probs['up']
+                    lengths[length+1] += p*probs['up']
+                else:
+                    final[state] += p*probs['up']
+                    lengths[length] += p*probs['up']
+
+                # Same class
+                for c, q in self._same[careername]:
+                    new_mass[(c, rank)] += p*probs['same']*q
+
+                # Other classes depend only on this class, so collect them up
+                other_mass[career_table.career_class[careername]] += p*probs['other']
+
+                # Stop
+                final[state] += p*probs['stop']
+                lengths[length] += p*probs['stop']
+
+            for classname, p in other_mass.items():
+                for c, q in self._other[classname]:
+                    new_mass[(c, 1)] += p*q
+
+            for state, p in new_mass.items():
+                visits[state] += p
+
+            mass = new_mass
+            die = self.die
+            length += 1
+
+        while lengths and lengths[-1] == 0.0:
+            lengths.pop()
+
+        xp = sum(p*_state_xp(*state) for state, p in visits.items()) - 100
+        result = ChainResult(dict(final), lengths, dict(visits), xp)
+        self._results[key] = result
+        return result
+
+    def final_distribution(self, start : tuple = None, force_first : bool = False) -> dict:
+        """ Probability of the career history ending in each (career, rank) """
+        return dict(self.run(start, force_first).final)
+
+    def final_career_distribution(self, start : tuple = None, force_first : bool = False) -> dict:
+        """ Probability of the career history ending in each career """
+        careers = collections.defaultdict(float)
+        for (careername, rank), p in self.run(start, force_first).final.items():
+            careers[careername] += p
+
+        return dict(careers)
+
+    def final_rank_distribution(self, start : tuple = None, force_first : bool = False) -> dict:
+        """ Probability of the career history ending at each rank """
+        ranks = collections.defaultdict(float)
+        for (careername, rank), p in self.run(start, force_first).final.items():
+            ranks[rank] += p
+
+        return dict(sorted(ranks.items()))
+
+    def length_distribution(self, start : tuple = None, force_first : bool = False) -> list:
+        """ Probability of each career history length. Index 0 is always zero """
+        return list(self.run(start, force_first).lengths)
+
+    def expected_length(self, start : tuple = None, force_first : bool = False) -> float:
+        """ Expected number of career ranks in the career history """
+        return sum(n*p for n, p in enumerate(self.run(start, force_first).lengths))
+
+    def expected_xp(self, start : tuple = None, force_first : bool = False) -> float:
+        """ Expected XP spend on the career history, using the per-entry estimate of state_xp() """
+        return self.run(start, force_first).xp
+
+    def reach_probabilities(self, target : tuple) -> dict:
+        """ The probability, from each (career, rank), that the career history ends in the target
+            (career, rank). These are the backward tables used to sample career histories
+            conditioned on how they end, and are cached per target """
+        target = (target[0].title(), target[1])
+        if target in self._reach:
+            return self._reach[target]
+
+        h = dict.fromkeys(self.states, 0.0)
+        delta = 1.0
+        while delta > self.tolerance:
+            h_other = {classname: sum(q*h[(c, 1)] for c, q in table) for classname, table in self._other.items()}
+
+            new_h = dict()
+            delta = 0.0
+            for state in self.states:
+                careername, rank = state
+                probs = self.roll_probabilities(state)
+
+                p = 0.0
+                if rank < 3:
+                    p += probs['up']*h[(careername, rank+1)]
+                elif (careername, 4) == target:
+                    p += probs['up']
+
+                p += probs['same']*sum(q*h[(c, rank)] for c, q in self._same[careername])
+                p += probs['other']*h_other[career_table.career_class[careername]]
+
+                if state == target:
+                    p += probs['stop']
+
+                delta = max(delta, p - h[state])
+                new_h[state] = p
+            h = new_h
+
+        self._reach[target] = h
+        return h
+
+    def sample_path(self, start : tuple = None, target : tuple = None, force_first : bool = False, rng=None) -> list:
+        """ Sample a career history from the chain, conditioned on it ending in target (career, rank).
+
+            If start is None the first career is random and is included in the list returned,
+            otherwise the list is the career ranks taken after start. Every career rank is
+            drawn once, directly from the conditioned distribution, so there is no rejection
+            or patching up. Returns None if the target can't be reached from start.
+        """
+        rng = rng or random
+        target = (target[0].title(), target[1])
+        h = self.reach_probabilities(target)
+
+        def _choose(candidates):
+            total = sum(weight for weight, _ in candidates)
+            if total <= 0: return None
+
+            u = rng.random() * total
+            for weight, choice in candidates:
+                u -= weight
+                if u < 0 and weight > 0: return choice
+
+            # Rounding, so take the last possible choice
+            return next(choice for weight, choice in reversed(candidates) if weight > 0)
+
+        path = []
+        if start is None:
+            state = _choose([(p*h[s], s) for s, p in self._start.items()])
+            if state is None: return None
+            path.append(state)
+        else:
+            state = (start[0].title(), start[1])
+            if state not in h: return None
+
+        die = 4 if force_first else self.die
+        while True:
+            careername, rank = state
+            probs = self.roll_probabilities(state, die)
+
+            # Each candidate is the next state, or ('end', entry) where entry is the last
+            # career rank to add (or None) before the career history ends
+            candidates = []
+            if rank < 3:
+                candidates.append((probs['up']*h[(careername, rank+1)], (careername, rank+1)))
+            elif (careername, 4) == target:
+                candidates.append((probs['up'], ('end', (careername, 4) if rank == 3 else None)))
+
+            for c, q in self._same[careername]:
+                candidates.append((probs['same']*q*h[(c, rank)], (c, rank)))
+
+            for c, q in self._other[career_table.career_class[careername]]:
+                candidates.append((probs['other']*q*h[(c, 1)], (c, 1)))
+
+            if state == target:
+                candidates.append((probs['stop'], ('end', None)))
+
+            choice = _choose(candidates)
+            if choice is None: return None
+
+            if choice[0] == 'end':
+                if choice[1]: path.append(choice[1])
+                return path
+
+            state = choice
+            path.append(state)
+            die = self.die
+
+
+@functools.lru_cache(maxsize=None)
+def _career_chain(species : str, young : bool) -> CareerChain4:
+    return CareerChain4(species, young)
+
+def career_chain(species : str, young : bool = False) -> CareerChain4:
+    """ The (shared) chain for a species, for adult or young NPCs """
+    return _career_chain(career_table.check_species(species), bool(young))
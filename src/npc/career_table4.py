@@ -0,0 +1,140 @@
+from ...data import bot_char_dat
+from ..utility.weighted_table import WeightedTable
+from .careers4 import _careers_data
+
+class CareerTable4:
+    """ The species × career weight matrix from bot_char_dat.career_table_4e, compiled once.
+
+        For each species, and for both the first career and later career variants, weighted
+        tables are kept for all careers, for each class, for all careers outside each class,
+        and for each career's classmates. Every draw is then O(1). The random_career methods
+        draw with rng (a random.Random) if given, otherwise the random module.
+    """
+
+    # Column order of bot_char_dat.career_table_4e
+    species = ('Reiklander','Dwarf','Halfling','High Elf','Wood Elf','Gnome','Middenheimer','Middenlander', 'Nordlander', 'Ogre')
+
+    # Careers which are only available as later careers, and the species which can't take them
+    later_careers = ('Cult Magus Of Tzeentch', 'Warrior Of Tzeentch')
+    no_later_careers = ('dwarf','halfling','gnome','ogre')
+
+    class NoCareersSpecies(Exception):
+        def __init__(self, species):
+            super().__init__(f'Cannot generate random career for {species}. This species does not have a career probability table (e.g. corebook, p.30-31).')
+
+    def __init__(self):
+        # Careers and their classes, in the order of the careers data
+        self.careers = tuple(_careers_data.keys())
+        self.index = {careername: idx for idx, careername in enumerate(self.careers)}
+        self.career_class = {careername: _careers_data[careername]['class'] for careername in self.careers}
+
+        self.careers_by_class = dict()
+        for careername, classname in self.career_class.items():
+            self.careers_by_class.setdefault(classname, []).append(careername)
+
+        # Build the weight matrix. Careers not in the table (or only in the data with different
+        # capitalisation) are matched by title case, and are otherwise given a weight of zero
+        nspecies = len(self.species)
+        stride = nspecies+1
+        table = bot_char_dat.career_table_4e
+        self._first_weights = {species: [0]*len(self.careers) for species in self.species}
+        for row in range(0, len(table), stride):
+            careername = table[row].title()
+            if careername not in self.index: continue
+            for col, species in enumerate(self.species):
+                self._first_weights[species][self.index[careername]] = table[row+1+col]
+
+        self._later_weights = dict()
+        for species, weights in self._first_weights.items():
+            weights = list(weights)
+            for careername in self.later_careers:
+                weights[self.index[careername]] = 0 if species.lower() in self.no_later_careers else 1
+            self._later_weights[species] = weights
+
+        self._compiled = dict()
+
+    def _table(self, careers, weights) -> WeightedTable:
+        """ A weighted table of the given careers """
+        return WeightedTable(careers, weights=[weights[self.index[careername]] for careername in careers])
+
+    def _compile(self, species, firstcareer):
+        """ Compile (once) all the weighted tables for a species and variant """
+        key = (species, firstcareer)
+        if key in self._compiled:
+            return self._compiled[key]
+
+        weights = self.weights(species, firstcareer)
+
+        tables = dict()
+        tables['all'] = self._table(self.careers, weights)
+        for classname, classcareers in self.careers_by_class.items():
+            others = [careername for careername in self.careers if self.career_class[careername]!=classname]
+            tables[('class', classname)] = self._table(classcareers, weights)
+            tables[('other', classname)] = self._table(others, weights)
+
+        for careername in self.careers:
+            classmates = [x for x in self.careers_by_class[self.career_class[careername]] if x!=careername]
+            tables[('same', careername)] = self._table(classmates, weights)
+
+        self._compiled[key] = tables
+        return tables
+
+    def check_species(self, species) -> str:
+        """ Return the table's name for a species, raising NoCareersSpecies if it has no column """
+        species = species.title()
+        if species not in self._first_weights:
+            raise self.NoCareersSpecies(species)
+
+        return species
+
+    def weights(self, species, firstcareer=True) -> list:
+        """ The weight of each career (in the order of self.careers) for a species """
+        species = self.check_species(species)
+        return self._first_weights[species] if firstcareer else self._later_weights[species]
+
+    def weight(self, species, careername, firstcareer=True):
+        """ The weight of a single career for a species """
+        return self.weights(species, firstcareer)[self.index[careername.title()]]
+
+    def can_change_same_class(self, species, careername, firstcareer=False) -> bool:
+        """ Whether this species has any other career in the same class as careername """
+        return self._compile(self.check_species(species), firstcareer)[('same', careername.title())].total > 0
+
+    def can_change_other_class(self, species, careername, firstcareer=False) -> bool:
+        """ Whether this species has any career outside the class of careername """
+        classname = self.career_class[careername.title()]
+        return self._compile(self.check_species(species), firstcareer)[('other', classname)].total > 0
+
+    def random_career(self, species, firstcareer=True, rng=None) -> str:
+        """ Draw any career using the species weights """
+        return self._compile(self.check_species(species), firstcareer)['all'].draw(rng=rng)
+
+    def random_career_in_class(self, species, classname, firstcareer=False, rng=None) -> str:
+        """ Draw a career from the specified class """
+        return self._compile(self.check_species(species), firstcareer)[('class', classname)].draw(rng=rng)
+
+    def random_career_same_class(self, species, careername, firstcareer=False, rng=None) -> str:
+        """ Draw a different career in the same class as careername """
+        return self._compile(self.check_species(species), firstcareer)[('same', careername.title())].draw(rng=rng)
+
+    def random_career_other_class(self, species, careername, firstcareer=False, rng=None) -> str:
+        """ Draw a career from any class other than the class of careername """
+        classname = self.career_class[careername.title()]
+        return self._compile(self.check_species(species), firstcareer)[('other', classname)].draw(rng=rng)
+
+    def random_career_from(self, species, careerslist, firstcareer=True, rng=None) -> str:
+        """ Draw a career from an arbitrary list of careers, still using the species weights """
+        careers = tuple(careername.title() for careername in careerslist if careername.title() in self.index)
+
+        # Compiled the first time each list is seen, alongside the species' other tables
+        species = self.check_species(species)
+        tables = self._compile(species, firstcareer)
+        key = ('from', careers)
+        if key not in tables:
+            tables[key] = self._table(careers, self.weights(species, firstcareer))
+
+        return tables[key].draw(rng=rng)
+
+
+# Shared, compiled once at import
+career_table = CareerTable4()
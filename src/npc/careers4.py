@@ -2,10 +2,14 @@ import json
 import importlib.resources
 
 from ... import data
+from ..utility.find_best_match import FuzzyIndex
 
 with importlib.resources.open_text(data,'careers.json') as f:
     _careers_data = json.load(f)
 
+# The career names don't change, so every Careers4 matches against the same index
+_career_index = FuzzyIndex(_careers_data.keys())
+
 class Careers4:
     # Load data about careers, talents and skills
     def __init__(self):
@@ -77,6 +81,14 @@ class Careers4:
 
         return career_levels
 
+    def suggest(self, careername : str, k : int = 3) -> list:
+        """ Up to k careers which might be what was meant, best first """
+        return [suggestion.option for suggestion in _career_index.suggest(careername.title(), k)]
+
+    def best_match(self, careername : str) -> str:
+        """ The career that best matches careername, allowing for misspellings """
+        return _career_index.best_match(careername.title())
+
     def __getitem__(self, key):
         key = key.title()
         return dict(_careers_data[key])
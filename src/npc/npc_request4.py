@@ -0,0 +1,74 @@
+import collections, collections.abc
+
+from ...data.bestiary import species_npc_characteristics_4e
+
+# The canonical form of everything that can be asked for when making an NPC4e. It's immutable
+# and hashable, so identical requests compare equal however they were typed
+#   careers - tuple of 'any' or (Career, rank), title-cased and with adjacent duplicates removed
+#   characteristics  - tuple of (characteristic, value) in the usual order, M, WS, BS, ...
+#   initial_skills   - tuple of (skill, value), sorted
+#   initial_talents, initial_trappings - tuple of (name, value) sorted if given as a dict,
+#                      otherwise a frozenset of names
+NPCRequest = collections.namedtuple('NPCRequest', ['species', 'careers', 'age', 'filter', 'lore',
+                                                   'characteristics', 'initial_skills', 'initial_talents', 'initial_trappings',
+                                                   'seed'])
+
+# The order characteristics are listed in, anything else goes after them in alphabetical order
+_characteristic_order = {name: position for position, name in enumerate(species_npc_characteristics_4e['human'])}
+
+def _canonical_characteristics(characteristics : dict) -> tuple:
+    return tuple(sorted(characteristics.items(), key=lambda item: (_characteristic_order.get(item[0], len(_characteristic_order)), item[0])))
+
+def _canonical_collection(collection):
+    """ Dicts keep their values, as sorted (name, value) pairs, anything else is a set of names """
+    if isinstance(collection, collections.abc.Mapping):
+        return tuple(sorted(collection.items()))
+    return frozenset(collection)
+
+def canonical_request(species : str = None, careers : list = None, age : str = None, filter : str = None, lore : str = None,
+                      characteristics : dict = None, initial_skills : dict = None, initial_talents=None, initial_trappings=None,
+                      seed=None) -> NPCRequest:
+    """ Normalise the arguments of an NPC4e into an NPCRequest """
+    canonical_careers = []
+    for career in careers or ['any']:
+        if isinstance(career, (tuple, list)) and len(career) == 2 and isinstance(career[0], str):
+            career = (career[0].title(), career[1])
+
+        # Something like ['any','any','any'] will cause problems later. But ['any', ('Guard',2), 'any']
+        # is valid, so only remove duplicates where they're next to each other
+        if not canonical_careers or canonical_careers[-1] != career:
+            canonical_careers.append(career)
+
+    return NPCRequest(species           = species.title() if species else None,
+                      careers           = tuple(canonical_careers),
+                      age               = age,
+                      filter            = filter,
+                      lore              = lore,
+                      characteristics   = _canonical_characteristics(characteristics) if characteristics else None,
+                      initial_skills    = tuple(sorted(initial_skills.items())) if initial_skills else None,
+                      initial_talents   = _canonical_collection(initial_talents) if initial_talents else None,
+                      initial_trappings = _canonical_collection(initial_trappings) if initial_trappings else None,
+                      seed              = seed)
+
+def request_arguments(request : NPCRequest) -> dict:
+    """ Turn a request back into keyword arguments for NPC4e """
+    arguments = request._asdict()
+    arguments['careers'] = list(request.careers)
+    for field in ('characteristics', 'initial_skills'):
+        if arguments[field] is not None: arguments[field] = dict(arguments[field])
+    for field in ('initial_talents', 'initial_trappings'):
+        if isinstance(arguments[field], tuple):
+            arguments[field] = dict(arguments[field])
+        elif arguments[field] is not None:
+            arguments[field] = set(arguments[field])
+
+    return arguments
+
+def request_to_dict(request : NPCRequest) -> dict:
+    """ The request as a dictionary of JSON compatible types, sets of names become sorted lists.
+        canonical_request(**state) turns it back into the same request """
+    state = request_arguments(request)
+    for field in ('initial_talents', 'initial_trappings'):
+        if isinstance(state[field], set): state[field] = sorted(state[field])
+
+    return state
@@ -1,35 +1,36 @@
-import itertools
 import random
-import sys
 
 from .buildNPC4 import BuildNPC4
-from ..utility.find_best_match import find_best_match
-from .careers4 import Careers4
-
-from ...data import bot_char_dat
+from .career_chain4 import career_chain
+from .career_table4 import CareerTable4, career_table
+from ..utility.weighted_table import WeightedTable
 
 class RandomNPC4(BuildNPC4):
     """Create a randomly generated NPC"""
 
     def __init__(self, species=None, starting_career=None, young=False, target=None, lore=None,
                        characteristics=None, starting_skills = None, starting_talents=None, starting_trappings=None,
-                       init_only=False):
+                       init_only=False, seed=None, rng=None):
         """Options are to define the species, a starting career, whether the NPC is young
            and a final career. The last uses a dictionary of the form {'career':'string', rank:n}
         """
+        # The NPC's own generator, made now so that the random species is reproducible too
+        rng = random.Random(seed) if rng is None else rng
+
         if not species:
             # Generate random species
-            species = self.random_species()
+            species = self.random_species(rng)
         
         if species.lower()=='human':
-            species = self.random_human()
+            species = self.random_human(rng)
 
         # Initialise base class
         BuildNPC4.__init__(self, species, lore,
                             characteristics=characteristics,
                             starting_skills=starting_skills, 
                             starting_talents=starting_talents,
-                            starting_trappings=starting_trappings)
+                            starting_trappings=starting_trappings,
+                            seed=seed, rng=rng)
 
         # Record anything we might need to use to rebuild the class
         self._young = young
@@ -43,45 +44,45 @@ class RandomNPC4(BuildNPC4):
         else:
             self._add_random_careers(starting_career,young)
 
-    class NoCareersSpecies(Exception):
-        def __init__(self, species):
-            super().__init__(f'Cannot generate random career for {species}. This species does not have a career probability table (e.g. corebook, p.30-31).')
+    NoCareersSpecies = CareerTable4.NoCareersSpecies
+
+    def to_dict(self) -> dict:
+        state = BuildNPC4.to_dict(self)
+        state['young'] = self._young
+        return state
+
+    @classmethod
+    def from_dict(cls, state : dict):
+        npc = super().from_dict(state)
+        npc._young = state.get('young', False)
+        return npc
+
+    _species_table  = WeightedTable(['Human','Halfling','Dwarf','Ogre','High Elf','Wood Elf'], cum_weights=[89,92,97,98,99,100])
+    _humans_table   = WeightedTable(['Reiklander','Middenheimer','Middenlander','Nordlander'], weights=[5,1,2,2])
 
 
     @classmethod
     def known_species(cls):
-        return ['Reiklander','Dwarf','Halfling','High Elf','Wood Elf','Gnome','Middenheimer','Middenlander', 'Nordlander', 'Ogre']
+        return list(CareerTable4.species)
 
     @classmethod
     def known_humans(cls):
         return ['Reiklander','Middenheimer','Middenlander', 'Nordlander']
 
     @classmethod
-    def random_species(cls):
+    def random_species(cls, rng=None):
         """ Generate a random valid species, with defined probabilities """
-        species = random.choices(['Human','Halfling','Dwarf','Ogre','High Elf','Wood Elf'], cum_weights=[89,92,97,98,99,100])[0]
+        species = cls._species_table.draw(rng=rng)
         
         if species.lower()=='human':
-           species = cls.random_human()
+           species = cls.random_human(rng)
 
         return species
 
     @classmethod
-    def random_human(cls):
+    def random_human(cls, rng=None):
         """ Generate a random valid human type (from the defined types), with defined probabilities """
-        return random.choices(['Reiklander','Middenheimer','Middenlander','Nordlander'], weights=[5,1,2,2])[0]
-
-
-    def _careers_by_class(self):        
-        careers_by_class = dict()
-        for careername in Careers4().careers:
-            classname = Careers4()[careername]['class']
-            if classname in careers_by_class:
-                careers_by_class[classname].update([careername])
-            else:
-                careers_by_class[classname] = set([careername])
-
-        return careers_by_class
+        return cls._humans_table.draw(rng=rng)
 
 
     def _add_random_careers(self, career, young=False, force_first=False):
@@ -102,38 +103,30 @@ class RandomNPC4(BuildNPC4):
         # Add the specified career and carry on from here
         self.add_career_rank(career_name,career_rank)
 
-        careers_by_class = self._careers_by_class()
-
+        # NOTE: career_chain4.CareerChain4 models these rules exactly, so keep the two in step
         more_careers = True
         while (more_careers):
             # Roll a dice to determine what to do
             # If an adult it's a d6, if young it's a d8 (higher numbers make us stop)
-            if (force_first):
-                dtype = 4
-                force_first = False
-            else:
-                dtype = 6 if not young else 8
-            val = random.randint(1,dtype)
+            dtype = 4 if force_first else (6 if not young else 8)
+            val = self._rng.randint(1,dtype)
 
             if val<=2:
                 # Keep in the career but go up a rank
+                if career_rank == 4: break  # Can't go beyond the max career rank
                 career_rank += 1
                 self.add_career_rank(career_name,career_rank)                    
                 if career_rank == 4: more_careers = False  # Stop if this is max career rank
             elif val==3:
-                # Change to a career within the same class
-                # Determine what the other classes are
-                thisclass = Careers4()[career_name]['class']
-                newcareers = careers_by_class[thisclass].difference([career_name])
-                career_name = self._random_career(careerslist=newcareers,firstcareer=False)
+                # Change to a career within the same class. If this species has no other
+                # careers in this class then reroll
+                if not career_table.can_change_same_class(self._species, career_name): continue
+                career_name = career_table.random_career_same_class(self._species, career_name, rng=self._rng)
                 self.add_career_rank(career_name,career_rank)
             elif val==4:
                 # Change to a career in another class
-                # Find this class, then find all careers in careers_by_class which are not that class
-                thisclass = Careers4()[career_name]['class']
-                newcareers = itertools.chain.from_iterable([careers for classname,careers in careers_by_class.items() if classname!=thisclass])
-
-                career_name = self._random_career(careerslist=newcareers,firstcareer=False)
+                if not career_table.can_change_other_class(self._species, career_name): continue
+                career_name = career_table.random_career_other_class(self._species, career_name, rng=self._rng)
 
                 # If we've been in this career before then perhaps we should rejoin at that rank?
                 career_rank = 1
@@ -142,167 +135,52 @@ class RandomNPC4(BuildNPC4):
                 # Just stop, we're finished
                 more_careers = False
 
+            force_first = False
 
     def _reverse_random_careers(self,target,young=False):
+        # Sample a whole career history from the usual career progression, conditioned on it
+        # finishing in the target career. The backward tables this needs are cached per species
+        # and target, so after the first request this is just a walk through the tables
         career = target['career'].title()
         rank   = target['rank']
-        careers_list = [(career,rank)]
-
-        careers_by_class = self._careers_by_class()
 
-        more_careers = True
-        while (more_careers):
-            # Roll a dice to determine what to do
-            # If an adult it's a d6, if young it's a d8 (higher numbers make us stop)
-            dtype = 6 if not young else 8
-            val = random.randint(1,dtype)
-
-            if val==3:
-                # Change to a career within the same class
-                # Determine what the other classes are
-                thisclass = Careers4()[career]['class']
-                newcareers = careers_by_class[thisclass].difference([career])
-                career = self._random_career(careerslist=newcareers,firstcareer=False)
-                careers_list.append((career,rank))
-            elif val==4:
-                # Change to a career in another class
-                # Find this class, then find all careers in careers_by_class which are not that class
-                
-                # Finish this class
-                for i in range(rank-1,0,-1):
-                    careers_list.append((career,i))
+        path = career_chain(self._species, young).sample_path(None, (career, rank), rng=self._rng)
 
-                # Now switch to new class
-                thisclass = Careers4()[career]['class']
-                newcareers = itertools.chain.from_iterable([careers for classname,careers in careers_by_class.items() if classname!=thisclass])
+        if path is None:
+            # This species can't end up in the target career by the normal rules, so just
+            # work through the ranks of the target career
+            path = [(career, level) for level in range(1, rank+1)]
 
-                career = self._random_career(careerslist=newcareers,firstcareer=False)
+        for career, rank in path:
+            self.add_career_rank(career, rank)
 
-                rank = random.choices([1,2,3], weights=[2,3,2])[0]
-                
-                careers_list.append((career,rank))
 
-            else:
-                # Keep in the career but go down a rank
-                rank -= 1
+    def _span_random_careers(self, startcareer, endcareer, young=False):
+        # Sample the careers between start and end directly from the career progression,
+        # conditioned on finishing in the end career. Each career rank is only added once
+        start_career = startcareer[0].title()
+        start_level  = startcareer[1]
+        end_career   = endcareer[0].title()
+        end_level    = endcareer[1]
 
-                if rank>0:
-                    careers_list.append((career,rank))
-                else:
-                    more_careers = False
+        self.add_career_rank(start_career, start_level)
 
-        careers_list.reverse()
-        for careerdata in careers_list:
-            career = careerdata[0]
-            rank   = careerdata[1]
-            self.add_career_rank(career,rank)
+        path = career_chain(self._species, young).sample_path((start_career, start_level), (end_career, end_level), rng=self._rng)
 
+        if path is None:
+            # The end career can't be reached by the normal rules (e.g. a rank below the start
+            # rank of the same career), so just go straight there
+            first_level = start_level+1 if start_career == end_career and start_level < end_level else 1
+            path = [(end_career, level) for level in range(first_level, end_level+1)]
 
-    def _span_random_careers(self, startcareer, endcareer, young=False):
-        # First go, let's not be clever, use the existing random generator and then simply append
-        # the required final career
-        self._add_random_careers(startcareer, young)
-
-        # Then handle the special case of the startcareer and endcareer being the same
-        if (startcareer == endcareer):
-            self._reverse_random_careers({'career':endcareer[0], 'rank':endcareer[1]}) 
-
-        # Details about where we are and where we want to be
-        end_career = endcareer[0].title()
-        end_level  = endcareer[1]
-        current_career = self._career_history[-1][0].title()
-        current_level = self._career_history[-1][1]
-
-        # Check whether we're currently in the desired career. If so we just need to adjust levels
-        if end_career == current_career:
-            if end_level == current_level:
-                pass
-            elif end_level>current_level:
-                # Add career levels until we're in the right place
-                for level in range(current_level+1,end_level+1):
-                    self.add_career_rank(end_career,level)
-            elif end_level<current_level:
-                # Damn, we have to remove career levels. The simplest way is simply to rebuild
-                # without those career levels. To do that we need to assemble a new revised 
-                # career history to apply
-                # This is trickier than it might seem because there are two ways we could get here
-                # Consider that we want a Priest (priest,2) but have generated a High Priest (priest,3)
-                # The most likely case is that we've simply overshot and the career history looks
-                # something like [... (priest,1), (priest,2), (priest,3)]. In this case we just need to
-                # delete the extar career levels
-                # But we could also have a case like [(wizard,3),(priest,3)] in which case we need to
-                # change the final career level
-                new_career_history = list(self._career_history)
-                while new_career_history[-1]!=(end_career,end_level):
-                    if new_career_history[-2][0] != end_career:
-                        new_career_history[-1] = (end_career,end_level)
-                    else:
-                        new_career_history.pop()
-                print(new_career_history)
-
-                newNPC = RandomNPC4(species=self._species, starting_career=None, young=self._young, 
-                                    characteristics=self._starting_characteristics,
-                                    starting_skills=self._starting_skills, starting_talents=self._starting_talents,
-                                    starting_trappings=self._starting_trappings,
-                                    init_only=True)
-
-                for career, level in new_career_history:
-                    newNPC.add_career_rank(career, level)
-                
-                self.__dict__.update(newNPC.__dict__)
-            
-            return
-
-        # We need to move the NPC to the new career and level
-        # Are we in the right class?
-        careers_by_class = self._careers_by_class()
-        class_by_careers = {}
-        for k,value in careers_by_class.items():
-            for v in value:
-                class_by_careers.setdefault(v,[]).append(k)
-
-        current_class = class_by_careers[current_career]
-        end_class     = class_by_careers[end_career]
-        if current_class == end_class:
-            if current_level>=end_level:
-                self.add_career_rank(end_career,end_level)
-            else:
-                for level in range(current_level,end_level+1):
-                    self.add_career_rank(end_career,level)
-        else:
-            for level in range(1,end_level+1):
-                self.add_career_rank(end_career,level)
+        for career, level in path:
+            self.add_career_rank(career, level)
 
 
     def _random_career(self, firstcareer=True, careerslist=None) -> str:
-        # Extract the information we need from the bot_char_dat.career_table_4e array
-        species_indexer = self.known_species()
-        careers = bot_char_dat.career_table_4e[0::11]
-        try:
-            probs = bot_char_dat.career_table_4e[species_indexer.index(self._species.title())+1::11]
-        except ValueError:
-            raise self.NoCareersSpecies(self._species.title())
-        except:
-            raise
-
-        # Append Cult Magus of Tzeentch to the probabilities as appropriate
-        if not firstcareer:
-            careers += ['Cult Magus Of Tzeentch', 'Warrior Of Tzeentch']
-            if self._index_species not in ['dwarf','halfling','gnome','ogre']:
-                probs += [1, 1]
-            else:
-                probs += [0, 0]
-
-        # If we've been provided a careerslist we still use the species weightings, but that means
-        # we need to assemble them
+        # The species weightings come from the compiled bot_char_dat.career_table_4e matrix.
+        # If we've been provided a careerslist we still use the species weightings
         if careerslist:
-            newcareers = []
-            newprobs   = []
-            for careername in careerslist:
-                idx = careers.index(careername)
-                newcareers.append(careername)
-                newprobs.append(probs[idx])
-            careers = newcareers
-            probs   = newprobs
-
-        return random.choices(careers,weights=probs)[0]
+            return career_table.random_career_from(self._species, careerslist, firstcareer, rng=self._rng)
+        else:
+            return career_table.random_career(self._species, firstcareer, rng=self._rng)
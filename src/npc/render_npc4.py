@@ -0,0 +1,280 @@
+import collections
+import html
+import io
+import json
+import random
+
+from . import skill_talent
+from .buildNPC4 import BuildNPC4
+from .careers4 import Careers4
+from .skills4 import Skills4
+from .talents4 import Talents4
+from ..utility.chunker import chunk_text
+from ..utility.convert_to_superscript import convert_number_to_footnote, convert_number_to_letters, convert_to_superscript
+
+# Everything needed to present an NPC, independent of the output format. Nothing is formatted
+#   title           - (species, species used, career name)
+#   characteristics - (names, starting values, final values)
+#   sections        - tuple of (label, value) in display order, empty optional sections are dropped.
+#                     A value is a tuple of names, of SkillViews or of TalentViews, the spells as
+#                     {spell list: [spells]}, or the XP spend
+NPCView = collections.namedtuple('NPCView', ['title', 'characteristics', 'sections'])
+
+# A skill as shown, after filtering and cross-referencing with the talents
+#   name, total - e.g. 'Melee (Basic)', 45
+#   refs        - the footnote numbers of the talents which go with the skill, sorted
+#   source, add - the career rank the skill came from and its advances, e.g. 'Soldier 2', 10.
+#                 Only set when the skill is listed more than once, otherwise None
+SkillView = collections.namedtuple('SkillView', ['name', 'total', 'refs', 'source', 'add'])
+
+# A talent as shown
+#   name    - e.g. 'Savvy'
+#   ref     - the footnote number of the skills which go with the talent, 0 if there are none
+#   applied - True for a starting talent whose characteristic modifier is already applied
+TalentView = collections.namedtuple('TalentView', ['name', 'ref', 'applied'])
+
+
+def crossref(npc : BuildNPC4, filter : str = None) -> tuple:
+    """ Filter the skills and talents of an NPC and cross-reference them with footnotes.
+        Returns the list of SkillViews, then the initial, suggested and additional talents """
+    skills_list = list()
+
+    # The extra skills and talents a filter lets through are chosen the same way every time for
+    # a seeded NPC, without using up the NPC's own random numbers
+    rng = random.Random(npc._seed)
+    filtered_skills_dict = Skills4().filter(npc.skills_verbose, filter, rng=rng)
+
+    # Talents
+    t4 = Talents4()
+    if npc.talents_initial:
+        talents_initial = t4.filter(npc.formatted_starting_talents, filter, rng=rng)
+    else:
+        talents_initial = {}
+
+    talents_suggested  = t4.filter(npc.talents_suggested, filter, rng=rng)
+    talents_additional = t4.filter(npc.talents_additional, filter, rng=rng)
+
+    # Association between skills and talents
+    filtered_skills_dict, talents_initial, index    = skill_talent.associate(filtered_skills_dict, talents_initial,    starting_index=1)
+    filtered_skills_dict, talents_suggested, index  = skill_talent.associate(filtered_skills_dict, talents_suggested,  starting_index=index)
+    filtered_skills_dict, talents_additional, index = skill_talent.associate(filtered_skills_dict, talents_additional, starting_index=index)
+
+    # Skills data
+    for skill, values in filtered_skills_dict.items():
+        for value in values:
+            refs = tuple(sorted(ref for ref in value.get('talent_ref', ()) if ref))
+            if value['source'] and len(values) > 1:
+                skills_list.append(SkillView(skill, value['total'], refs, value['source'], value['add']))
+            else:
+                skills_list.append(SkillView(skill, value['total'], refs, None, None))
+
+    return skills_list, talents_initial, talents_suggested, talents_additional
+
+def talent_views(talents : dict) -> tuple:
+    """ The talents from crossref() as TalentViews """
+    views = []
+    for name, value in talents.items():
+        applied = len(name) > 2 and name[0] == name[-1] == '*'
+        views.append(TalentView(name[1:-1] if applied else name, value.get('skill_ref', 0), applied))
+
+    return tuple(views)
+
+def format_skill(skill : SkillView) -> str:
+    """ A skill with its total and the footnotes of its talents, e.g. 'Dodge: 45⁽ᵃ⁾' """
+    superscript = convert_to_superscript(f"({' '.join(convert_number_to_footnote(ref) for ref in skill.refs)})") if skill.refs else ''
+    if skill.source is not None:
+        return "{!s}: {!r}{} [{}; +{}]".format(skill.name, skill.total, superscript, skill.source, skill.add)
+    return "{!s}: {!r}{}".format(skill.name, skill.total, superscript)
+
+def format_skills(skills : list) -> str:
+    """ Return all skills from crossref() as a footnoted list joined with commas """
+    return ', '.join(format_skill(skill) for skill in skills)
+
+def format_talent(talent : TalentView) -> str:
+    """ A talent with the footnote of its skills, in italics if it changed a characteristic """
+    name = f'*{talent.name}*' if talent.applied else talent.name
+    return '{}{}'.format(convert_number_to_footnote(talent.ref), name)
+
+def format_talents(talents) -> str:
+    """ Return all talents, from crossref() or as TalentViews, as a footnoted list joined with commas """
+    if isinstance(talents, dict): talents = talent_views(talents)
+    return ', '.join(format_talent(talent) for talent in talents)
+
+def social_standings(npc : BuildNPC4) -> list:
+    """ The status at each step of the career history """
+    careers = Careers4()
+    return [careers[career][f'rank {rank}']['status'] for career, rank in npc._career_history]
+
+def social_standing(npc : BuildNPC4) -> str:
+    """ The status at each step of the career history, joined with arrows """
+    return ' → '.join(social_standings(npc))
+
+def format_statblock(names, base, final) -> str:
+    """ The Discord statblock, a grid of the characteristics in code format """
+    return '\n'.join(['`|{}|`'.format('|'.join([f'{x:>3}' for x in names])),
+                      '`|{}|`'.format('|'.join([f'{x:3}' for x in base])),
+                      '`|{}|`'.format('|'.join([f'{x:3}' for x in final]))])
+
+
+def view(npc, filter : str = None) -> NPCView:
+    """ Collect everything needed to present an NPC4e or BuildNPC4. An NPC4e is shown with
+        its own filter unless a different one is given. The NPC isn't changed, and nothing is
+        chosen at random, so the spells are only those already chosen """
+    if isinstance(npc, BuildNPC4):
+        build = npc
+        skills, talents_initial, talents_suggested, talents_additional = crossref(build, filter)
+    else:
+        build = npc._npc
+        skills, talents_initial, talents_suggested, talents_additional = npc._crossref(filter)
+
+    characteristics = build.characteristics
+    sections = (('Career History',       tuple(build.career_history_unambiguous)),
+                ('Social Standing',      tuple(social_standings(build))),
+                ('Skills',               tuple(skills)),
+                ('Starting Talents',     talent_views(talents_initial)),
+                ('Suggested Talents',    talent_views(talents_suggested)),
+                ('Additional Talents',   talent_views(talents_additional)),
+                ('Traits',               tuple(build.traits)),
+                ('Optional Traits',      tuple(build.optional_traits)),
+                ('Trappings',            tuple(build.trappings)),
+                ('Additional Trappings', tuple(build.additional_trappings)),
+                ('Spells',               build.chosen_spells),
+                ('XP Spend',             build.xp_spend))
+    always = ('Career History', 'Social Standing', 'Skills', 'Suggested Talents', 'Additional Talents', 'Traits', 'Optional Traits', 'Trappings', 'XP Spend')
+
+    return NPCView(title=(build.species.title(), build.species_used.title(), build.careername),
+                   characteristics=(tuple(characteristics.keys()), tuple(build.characteristics_base.values()), tuple(characteristics.values())),
+                   sections=tuple((label, value) for label, value in sections if value or label in always))
+
+
+##################################################################################################
+# Renderers. Each formats the sections of one NPCView and writes it to a stream
+
+# How the sections are joined, the rest are joined with commas
+_arrow_sections = ('Career History', 'Social Standing')
+
+def _format_section(label : str, value, spells_format : str) -> str:
+    """ The text of a section for markdown or text. spells_format is how each spell list is shown """
+    if label == 'Skills':
+        return format_skills(value)
+    if label.endswith('Talents'):
+        return format_talents(value)
+    if label == 'Spells':
+        return '\n'.join(spells_format.format(spell_list.title(), ', '.join(spells)) for spell_list, spells in value.items())
+    if label == 'XP Spend':
+        return '{:,}'.format(value)
+    return (' → ' if label in _arrow_sections else ', ').join(value)
+
+_markdown_title   = '{} ({}) {}\n'
+_markdown_section = '**{}**: {}\n'
+_markdown_spells  = '__{}__: {}'
+
+def _render_markdown(npcview : NPCView, stream):
+    stream.write(_markdown_title.format(*npcview.title))
+    sections = iter(npcview.sections)
+    for label, value in sections:
+        stream.write(_markdown_section.format(label, _format_section(label, value, _markdown_spells)))
+        if label == 'Social Standing': break
+
+    stream.write(format_statblock(*npcview.characteristics))
+    stream.write('\n')
+    for label, value in sections:
+        stream.write(_markdown_section.format(label, _format_section(label, value, _markdown_spells)))
+
+_text_title   = '{} ({}) {}\n'
+_text_section = '{}: {}\n'
+_text_spells  = '{}: {}'
+
+def _render_text(npcview : NPCView, stream):
+    stream.write(_text_title.format(*npcview.title))
+    for row in npcview.characteristics:
+        stream.write(' '.join([f'{x:>3}' for x in row]))
+        stream.write('\n')
+    for label, value in npcview.sections:
+        stream.write(_text_section.format(label, _format_section(label, value, _text_spells)))
+
+_html_title   = '<div class="npc">\n<h3>{} ({}) {}</h3>\n'
+_html_section = '<p><b>{}</b>: {}</p>\n'
+
+def _html_refs(refs) -> str:
+    return '<sup>{}</sup>'.format(' '.join(convert_number_to_letters(ref) for ref in refs)) if refs else ''
+
+def _html_value(label : str, value) -> str:
+    """ The escaped HTML of a section, with footnotes as <sup> and spell lists on separate lines """
+    if label == 'Skills':
+        items = ['{}: {}{}'.format(html.escape(skill.name), skill.total, _html_refs(skill.refs)) +
+                 ('' if skill.source is None else ' [{}; +{}]'.format(html.escape(str(skill.source)), skill.add))
+                 for skill in value]
+    elif label.endswith('Talents'):
+        items = [_html_refs([talent.ref] if talent.ref else []) + ('<i>{}</i>' if talent.applied else '{}').format(html.escape(talent.name))
+                 for talent in value]
+    elif label == 'Spells':
+        return '<br>\n'.join('<u>{}</u>: {}'.format(html.escape(spell_list.title()), html.escape(', '.join(spells)))
+                             for spell_list, spells in value.items())
+    elif label == 'XP Spend':
+        return '{:,}'.format(value)
+    else:
+        items = [html.escape(str(item)) for item in value]
+
+    return (' → ' if label in _arrow_sections else ', ').join(items)
+
+def _render_html(npcview : NPCView, stream):
+    stream.write(_html_title.format(*[html.escape(str(x)) for x in npcview.title]))
+    stream.write('<table class="characteristics">\n')
+    cell = '<th>{}</th>'
+    for row in npcview.characteristics:
+        stream.write('<tr>{}</tr>\n'.format(''.join([cell.format(html.escape(str(x))) for x in row])))
+        cell = '<td>{}</td>'
+    stream.write('</table>\n')
+    for label, value in npcview.sections:
+        stream.write(_html_section.format(html.escape(label), _html_value(label, value)))
+    stream.write('</div>\n')
+
+def _json_value(value):
+    """ Sections as JSON: SkillViews and TalentViews become objects, the rest is as it is """
+    if isinstance(value, tuple):
+        return [item._asdict() if hasattr(item, '_asdict') else item for item in value]
+    return value
+
+def _render_json(npcview : NPCView, stream):
+    species, species_used, careername = npcview.title
+    names, base, final = npcview.characteristics
+    json.dump({'species': species, 'species_used': species_used, 'careername': careername,
+               'characteristics_base': dict(zip(names, base)),
+               'characteristics':      dict(zip(names, final)),
+               'sections':             {label: _json_value(value) for label, value in npcview.sections}},
+              stream, ensure_ascii=False)
+
+# format: (renderer, text before the first NPC, text between NPCs, text after the last NPC)
+_renderers = {'markdown': (_render_markdown, '', '\n', ''),
+              'text':     (_render_text,     '', '\n', ''),
+              'html':     (_render_html,     '', '',   ''),
+              'json':     (_render_json,     '[', ',\n', ']\n')}
+
+def known_formats() -> list:
+    return list(_renderers.keys())
+
+def write_npcs(npcs, stream, format : str = 'markdown', filter : str = None) -> None:
+    """ Write any number of NPCs (NPC4e or BuildNPC4) to a stream in the same format. Each NPC
+        is written as it's reached, so npcs can be a generator """
+    renderer, head, separator, tail = _renderers[format]
+
+    stream.write(head)
+    for i, npc in enumerate(npcs):
+        if i: stream.write(separator)
+        renderer(view(npc, filter), stream)
+    stream.write(tail)
+
+def write_npc(npc, stream, format : str = 'markdown', filter : str = None) -> None:
+    """ Write a single NPC to a stream """
+    _renderers[format][0](view(npc, filter), stream)
+
+def render(npc, format : str = 'markdown', filter : str = None) -> str:
+    """ Return a single NPC rendered as a string """
+    stream = io.StringIO()
+    write_npc(npc, stream, format, filter)
+    return stream.getvalue()
+
+def render_chunks(npc, format : str = 'markdown', filter : str = None, title : str = '', limit : int = 1024) -> list:
+    """ Render a single NPC and split it into (title, text) chunks of under limit characters """
+    return list(chunk_text(render(npc, format, filter), title, limit))
@@ -28,8 +28,11 @@ class Skills4:
     def __getitem__(self, key):
         return dict(_skills_data[key])
 
-    def filter(self, skilldict, type : str, noextra=False) -> set:
+    def filter(self, skilldict, type : str, noextra=False, rng=None) -> set:
+        """ The skills of the type given, 'combat', 'social' or 'utility', and unless noextra one
+            random skill of each other type. rng is a random.Random, otherwise the random module """
         if not type: return skilldict
+        rng = rng or random
 
         skilllist = skilldict.keys()
         skilllist = [x.split('(')[0].strip() for x in skilllist]
@@ -54,15 +57,15 @@ class Skills4:
         
         if type != 'combat':
             skill_choices = combat_skills - output
-            if skill_choices: output.update((random.choice(list(skill_choices)),))
+            if skill_choices: output.update((rng.choice(sorted(skill_choices)),))
         
         if type != 'social':
             skill_choices = social_skills - output
-            if skill_choices: output.update((random.choice(list(skill_choices)),))
+            if skill_choices: output.update((rng.choice(sorted(skill_choices)),))
         
         if type != 'utility':
             skill_choices = utility_skills - output
-            if skill_choices: output.update((random.choice(list(skill_choices)),))
+            if skill_choices: output.update((rng.choice(sorted(skill_choices)),))
 
         # Slightly complex bit of logic here. We're doing two things
         # First we're making sure we have all the instances of group skills
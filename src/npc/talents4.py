@@ -27,8 +27,11 @@ class Talents4:
     def __getitem__(self, key) -> dict:
         return dict(_talents_data[key])
 
-    def filter(self, talentlist, type : str, noextra=False):
+    def filter(self, talentlist, type : str, noextra=False, rng=None):
+        """ The talents of the type given, 'combat', 'social' or 'utility', and unless noextra one
+            random talent of each other type. rng is a random.Random, otherwise the random module """
         if not type: return talentlist
+        rng = rng or random
 
         combat_talents  = set(talentlist).intersection(self._combat_talents)
         social_talents  = set(talentlist).intersection(self._social_talents)
@@ -48,17 +51,17 @@ class Talents4:
         
         if type != 'combat':
             talent_choices = combat_talents - output
-            if talent_choices: output.update((random.choice(list(talent_choices)),))
+            if talent_choices: output.update((rng.choice(sorted(talent_choices)),))
         
         if type != 'social':
             talent_choices = social_talents - output
-            if talent_choices: output.update((random.choice(list(talent_choices)),))
+            if talent_choices: output.update((rng.choice(sorted(talent_choices)),))
         
         if type != 'utility':
             talent_choices = utility_talents - output
-            if talent_choices: output.update((random.choice(list(talent_choices)),))
+            if talent_choices: output.update((rng.choice(sorted(talent_choices)),))
 
-        return collections.OrderedDict({key: talentlist[key] for key in list(output)})
+        return collections.OrderedDict({key: talentlist[key] for key in talentlist if key in output})
 
 def main():
     with open('data/careers.json') as f:
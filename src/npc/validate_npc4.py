@@ -0,0 +1,60 @@
+import collections
+
+from ..magic4e import magic
+from .career_table4 import CareerTable4, career_table
+from .careers4 import Careers4
+from ..utility.find_best_match import did_you_mean
+
+# A problem with an NPC request
+#   field   - the argument with the problem, e.g. 'species', 'careers' or 'lore'
+#   value   - the value which was a problem
+#   message - an explanation suitable for users
+ValidationError = collections.namedtuple('ValidationError', ['field', 'value', 'message'])
+
+# Every name a lore is known by, in lower case
+_lore_names = frozenset(name.lower() for name in magic.lores_all)
+
+def _valid_lore(lore : str) -> bool:
+    """ Lores are matched fuzzily when the NPC is built, so only fall back to that if the name
+        isn't known exactly """
+    return lore.lower() in _lore_names or magic.canonise_lore(lore) is not None
+
+def _suggest_random_species(species : str, k : int = 3) -> list:
+    """ Known species like the one given which can have random careers """
+    from ..npc4e import NPC4e  # Not at the top, npc4e needs this module
+
+    suggestions = NPC4e.suggest_species(species, k=len(NPC4e.known_species()))
+    return [suggestion.title() for suggestion in suggestions if suggestion.title() in CareerTable4.species or suggestion == 'human'][:k]
+
+def validate_request(species : str = None, careers : list = None, lore : str = None) -> list:
+    """ Check an NPC request before any building is done. Returns a list of ValidationErrors,
+        which is empty if the request is fine """
+    errors = []
+    careers = careers or ['any']
+
+    for career in careers:
+        if career == 'any':
+            continue
+
+        if not (isinstance(career, (tuple, list)) and len(career) == 2 and isinstance(career[0], str)):
+            errors.append(ValidationError('careers', career, f"I don't understand the career {career}"))
+            continue
+
+        careername, rank = career
+        if careername.title() not in career_table.index:
+            errors.append(ValidationError('careers', career, f"I don't know the career {careername}." + did_you_mean(Careers4().suggest(careername))))
+
+        if not isinstance(rank, int) or rank < 1 or rank > 4:
+            errors.append(ValidationError('careers', career, f'Career ranks must be from 1 to 4, not {rank}'))
+
+    # Random careers need the species to have a column in the career table
+    if 'any' in careers and species and species.lower() != 'human':
+        try:
+            career_table.check_species(species)
+        except CareerTable4.NoCareersSpecies as e:
+            errors.append(ValidationError('species', species, str(e) + did_you_mean(_suggest_random_species(species))))
+
+    if lore and not _valid_lore(lore):
+        errors.append(ValidationError('lore', lore, magic.match_lore(lore).error))
+
+    return errors
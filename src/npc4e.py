@@ -1,23 +1,110 @@
-import itertools
+import json
 import random
+import zlib
 from typing import List, Mapping, Tuple
 
 from .npc.buildNPC4 import BuildNPC4
 from .npc.randomNPC4 import RandomNPC4
 
 from .npc.careers4 import Careers4
-from .npc.skills4 import Skills4
-from .npc.talents4 import Talents4
+from .npc import render_npc4
+from .npc.npc_request4 import NPCRequest, canonical_request, request_arguments, request_to_dict
+from .npc.validate_npc4 import ValidationError, validate_request
+from .utility.byte_lru_cache import ByteLRUCache
+from .utility.chunker import chunk_text
+from .utility.find_best_match import FuzzyIndex
 
-from .npc import skill_talent
+import sys, traceback
+import types
 
-from .utility.convert_to_superscript import *
+# Static help texts
+_help_text = """Generates a fully described 4e non-player character with a career path and stats, plus info on appearence, background, family, etc., taking account of any info provided in the command. NPCs may be generated with user-defined species and career path, random species and career path, or a combination of the two.
+The syntax is:
+
+`jodri:npc4 [species] [<career(s)>] [<place>] [<info>]`
+
+... where <species> can be any 4e playable species or human variant or any race from the core rulebook's bestiary, 
+....<career(s)> can be a series of career ranks (e.g., `scholar 3`) or career level names (e.g., `professor`) between which Jodri will insert valid career steps if required. Use of the `any` keyword will insert a random career (only valid for playable races).
+... <place> can specify a place, e.g., Nuln (see help places for more info)
+... and <info> can specify further NPC details (see NPC info below for more info)."""
+
+_examples_text = """> `j:npc4` a completely random NPC (equivalent to `j:npc4 any`)
+> `j:npc4 dwarf` a dwarf NPC with a random career path (equivalent to `j:npc4 dwarf any`)
+> `j:npc4 fellow` an NPC (of random race) with career path: `student → scholar → fellow`
+> `j:npc4 fimir guard 2` a fimir NPC with career path: `sentry → guard`
+> `j:npc4 middenlander merchant witch23` a human Middenlander with career path: `trader → merchant → witch → wyrd`
+> `j:npc4 reiklander any scholar3` a human Reiklander with a random career path that ends with `Scholar 3` (i.e., `Fellow`)
+> `j:npc4 wood elf ghost strider any` a wood elf NPC with an initial career path of `forest ranger → ghost strider`, followed by a random onward career path
+> `j:npc4 stormvermin any` not a valid command as only playable races may have random career paths"""
+
+_info_text = """
+Jodri understands:
+> Nationality: border princes / bretonnian / estalian / imperial / kislevite (ungol / gospodar) / norse / tilean
+> Region: e.g., reikland, skaeling, brionne, magritta, etc.
+> Birthplace: e.g., Nuln, Tobaro, etc. (check if I know about a place using j:lookup <place>)
+> Life Stage: boy / girl, young / mature / old, married / single
+> Build: emaciated / skinny / slight / slim / average / stocky / bulky / fat / huge (and tall / small)
+
+NPCs are generated according to the rules in the corebook p.314 ("Random Creatures and Custom PC Species") and Enemy in Shadows p.144 ("NPCs").
+
+Additional notes:
+- Characteristic modifying suggested or additional talents are not applied to the NPC.
+- The XP spend includes only characteristic and skill advances. Talents are not included.
+
+(Many thanks to @Monarda for this command!)"""
+
+_help_messages_text = """~~~NPC4~~~
+Generates a fully described 4e non-player character with a career path and stats, plus info on appearence, background, family, etc., taking account of any info provided in the command. NPCs may be generated with user-defined species and career path, random species and career path, or a combination of the two.
+The syntax is:
+
+`jodri:npc4 [species] [<career(s)>] [<place>] [<info>]`
+
+... where <species> can be any 4e playable species or human variant or any race from the core rulebook's bestiary, 
+....<career(s)> can be a series of career ranks (e.g., `scholar 3`) or career level names (e.g., `professor`) between which Jodri will insert valid career steps if required. Use of the `any` keyword will insert a random career path (only valid for playable races).
+... <place> can specify a place, e.g., Nuln (see help places for more info)
+... and <info> can specify further NPC details (see NPC info below for more info).
+
+~~~NPC4 Examples~~~
+> `j:npc4` a completely random NPC (equivalent to `j:npc4 any`)
+> `j:npc4 dwarf` a dwarf NPC with a random career path (equivalent to `j:npc4 dwarf any`)
+> `j:npc4 fellow` an NPC (of random race) with career path: `student → scholar → fellow`
+> `j:npc4 fimir guard 2` a fimir NPC with career path: `sentry → guard`
+> `j:npc4 middenlander merchant witch23` a human Middenlander with career path: `trader → merchant → witch → wyrd`
+> `j:npc4 reiklander any scholar3` a human Reiklander with a random career path that ends with `Scholar 3` (i.e., `Fellow`)
+> `j:npc4 wood elf ghost strider any` a wood elf NPC with an initial career path of `forest ranger → ghost strider`, followed by a random onward career path
+> `j:npc4 stormvermin any` not a valid command as only playable races may have random career paths
+> `j:npc young emaciated mutated reikland rat catcher`
+
+~~~NPC4 Info~~~
+Jodri understands:
+> Nationality: `border princes` / `bretonnian` / `estalian` / `imperial` / `kislevite` (`ungol` / `gospodar`) / `norse` / `tilean`
+> Region: e.g., `reikland`, `skaeling`, `brionne`, `magritta`, etc.
+> Birthplace: e.g., `Nuln`, `Tobaro`, etc. (check if I know about a place using `j:lookup <place>`)
+> Life Stage: `boy` / `girl`, `young` / `mature` / `old`, `married` / `single`
+> Build: `emaciated` / `skinny` / `slight` / `slim` / `average` / `stocky` / `bulky` / `fat` / `huge` (and `tall` / `small`)
+> Imperial Pronunciation: turn it off using `nopro`
+...and many other aspects of an npc can be specified using =: e.g., `eyes=Grey-Green`, `name=Hans`, `surname=Schmeckl`, `god=Sigmar`, `mutations=4`, etc.
+
+~~~NPC4 Explanations~~~
+NPCs are generated according to the rules in the corebook p.314 ("Random Creatures and Custom PC Species") and Enemy in Shadows p.144 ("NPCs").
+
+Additional notes:
+- Characteristic modifying suggested or additional talents are not applied to the NPC.
+- The XP spend includes only characteristic and skill advances. Talents are not included.
+
+(Many thanks to @Monarda for this command!)"""
 
-import sys, traceback
 
 class NPC4e:
     """ Make either a fully defined or randomly generated NPC"""
 
+    debug = False   # If set, error_msg_diagnostic includes the full traceback of unexpected errors
+
+    _message_chunks = types.MappingProxyType({'help':     tuple(chunk_text(_help_text, 'NPC4')),
+                                              'examples': tuple(chunk_text(_examples_text, 'NPC4 Examples')),
+                                              'info':     tuple(chunk_text(_info_text, 'NPC4 Info')),
+                                              'all':      tuple(chunk_text(_help_messages_text))})
+
     def __init__(self,
                  species : str=None,
                  careers : list=None,
@@ -28,7 +115,8 @@ class NPC4e:
                  characteristics   : dict=None,
                  initial_skills    : dict=None,
                  initial_talents   : dict=None,
-                 initial_trappings : dict=None):
+                 initial_trappings : dict=None,
+                 seed = None):
         """
         Create a new WFRP 4th edition NPC.
 
@@ -76,7 +164,21 @@ class NPC4e:
 
         initial_trappings:
         Directly add talents to the NPC. These are always printed at the end, irrespective of status, etc.
+
+        seed:
+        Seed for the random number generator, so that the same NPC can be generated again
         """
+        # Normalise the request once, this also title-cases and deduplicates the careers
+        self._request = canonical_request(species, careers, age, filter, lore, characteristics,
+                                          initial_skills, initial_talents, initial_trappings, seed)
+        species = self._request.species
+        careers = list(self._request.careers)
+        if characteristics: characteristics = dict(self._request.characteristics)
+
+        # The NPC's own random number generator, shared with the builder, so the same seed
+        # always gives the same NPC whatever else uses the random module
+        self._seed = seed
+        self._rng  = random.Random(seed)
 
         # Check for ages we understand
         if age=='young' in age: young = True 
@@ -87,19 +189,23 @@ class NPC4e:
         # in the rulebook for PCs. That means we never generate a random 'monster' if no
         # species is defined
         if not species:
-            species = RandomNPC4.random_species()
-
-        # If no career is defined then engage the random generator
-        if not careers:
-            careers = ['any']
+            species = RandomNPC4.random_species(self._rng)
 
         self._error            = None
         self._error_diagnostic = None
+        self._filter           = filter
+        self._sections         = dict()   # Rendered sections, memoised per filter. See _section()
+
+        # Check the request before doing any work
+        self._errors = validate_request(species, careers, lore)
+        if self._errors:
+            self._error = '\n'.join(error.message for error in self._errors)
+            return
+
         try:
-            # Deduplicate the input career list since something like ['any','any','any']
-            # will cause problems later. We have to be careful though as ['any', ('Guard',2), 'any']
-            # is valid. We only want to remove duplicates where they're next to each other
-            dedup_careers = [k for k, g in itertools.groupby(careers)]
+            # The careers are already deduplicated (see canonical_request), and if none were
+            # given this is ['any'] which engages the random generator
+            dedup_careers = careers
             firstcareer = True
 
             # Search the input career list for 'any'
@@ -113,7 +219,8 @@ class NPC4e:
                                         characteristics=characteristics, 
                                         starting_skills=initial_skills, 
                                         starting_talents=initial_talents,
-                                        starting_trappings=initial_trappings)
+                                        starting_trappings=initial_trappings,
+                                        seed=seed, rng=self._rng)
                 for career in dedup_careers or []:
                     self._add_career(firstcareer, career)
                     firstcareer = False
@@ -130,7 +237,8 @@ class NPC4e:
                                     starting_skills=initial_skills, 
                                     starting_talents=initial_talents,
                                     starting_trappings=initial_trappings,
-                                    init_only=True)
+                                    init_only=True,
+                                    seed=seed, rng=self._rng)
 
                 target_career = None
                 
@@ -165,7 +273,7 @@ class NPC4e:
                         if careers_copy[1] == 'any':
                             # Must be of form [(career,n), 'any', (career,n)]
                             self._prep_career_history(firstcareer, careers_copy)
-                            self._npc._span_random_careers(careers_copy[0], careers_copy[2])
+                            self._npc._span_random_careers(careers_copy[0], careers_copy[2], young)
                             dedup_careers = dedup_careers[3:]
                         else:
                             # Must be of form ['any', (career,n), 'any']
@@ -182,14 +290,155 @@ class NPC4e:
 
                     firstcareer = False
 
-            self._filter = filter
-            self._format()
+            # Choose the spells now, rendering the NPC doesn't choose anything
+            self._npc.choose_spells()
         except RandomNPC4.NoCareersSpecies as e:
             self._error = str(e)
         except Exception as e:
+            self._record_error(e)
+
+    def _record_error(self, e : Exception):
+        """ Keep an unexpected error for error_msg_diagnostic """
+        # The full traceback is expensive, so only produce it when debugging
+        if self.debug:
             print('Exception triggered')
             exc_type, exc_value, exc_traceback = sys.exc_info()
             self._error_diagnostic = '\n'.join(traceback.format_exception(e, exc_value, exc_traceback))
+        else:
+            self._error_diagnostic = f'{type(e).__name__}: {e}'
+
+    ##################################################################################################
+    # Requests
+
+    # Rendered output of seeded requests, which always give the same NPC
+    _render_cache = ByteLRUCache(4*1024*1024)
+
+    @property
+    def request(self) -> NPCRequest:
+        """ The canonical form of the request this NPC was made from """
+        return self._request
+
+    @classmethod
+    def from_request(cls, request : NPCRequest):
+        """ Make the NPC described by a request """
+        return cls(**request_arguments(request))
+
+    @classmethod
+    def render_request(cls, request : NPCRequest, format : str = 'markdown') -> str:
+        """ Make and render the NPC for a request. Requests with a seed are fully specified, so 
+            their output is cached. Raises ValueError if the NPC can't be made """
+        if request.seed is not None:
+            text = cls._render_cache.get((request, format))
+            if text is not None:
+                return text
+
+        npc = cls.from_request(request)
+        if npc.error_msg or npc.error_msg_diagnostic:
+            raise ValueError(npc.error_msg or npc.error_msg_diagnostic)
+
+        text = render_npc4.render(npc, format)
+        if npc.error_msg_diagnostic:
+            raise ValueError(npc.error_msg_diagnostic)
+
+        if request.seed is not None:
+            cls._render_cache.put((request, format), text)
+
+        return text
+
+    ##################################################################################################
+    # Serialisation
+
+    _serial_magic   = b'NPC4'
+    _serial_version = 1
+
+    def to_dict(self) -> dict:
+        """ The NPC as a dictionary of JSON compatible types. This is the build inputs, the seed 
+            and the choices made when building, but not any rendered output """
+        return {'version': self._serial_version,
+                'request': None if self._request is None else request_to_dict(self._request),
+                'age':     self._age,
+                'filter':  self._filter,
+                'seed':    self._seed,
+                'error':   self._error,
+                'errors':  [list(error) for error in self._errors],
+                'random':  isinstance(getattr(self, '_npc', None), RandomNPC4),
+                'npc':     self._npc.to_dict() if hasattr(self, '_npc') else None}
+
+    @classmethod
+    def from_dict(cls, state : dict):
+        """ Restore an NPC from to_dict(), without rebuilding it """
+        if state.get('version') != cls._serial_version:
+            raise ValueError(f"Unknown NPC serialisation version {state.get('version')}")
+
+        npc = cls.__new__(cls)
+        npc._age    = state['age']
+        npc._filter = state['filter']
+        npc._seed   = state['seed']
+        npc._error  = state['error']
+        npc._error_diagnostic = None
+        npc._sections = dict()
+
+        # JSON has no tuples, so careers come back as [career, rank] lists
+        npc._request = None if state.get('request') is None else canonical_request(**state['request'])
+        npc._errors  = [ValidationError(field, tuple(value) if isinstance(value, list) else value, message)
+                        for field, value, message in state.get('errors', [])]
+        if state['npc'] is not None:
+            npc._npc = (RandomNPC4 if state['random'] else BuildNPC4).from_dict(state['npc'])
+        npc._rng = npc._npc._rng if state['npc'] is not None else random.Random(npc._seed)
+
+        return npc
+
+    def to_bytes(self) -> bytes:
+        """ A compact binary form of to_dict(): a magic number and version byte, followed by 
+            the compressed JSON """
+        payload = json.dumps(self.to_dict(), separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        return self._serial_magic + bytes([self._serial_version]) + zlib.compress(payload, 9)
+
+    @classmethod
+    def from_bytes(cls, data : bytes):
+        """ Restore an NPC from to_bytes(). Raises ValueError if the data isn't a whole serialised NPC """
+        header = len(cls._serial_magic)
+        if len(data) <= header or data[:header] != cls._serial_magic or data[header] != cls._serial_version:
+            raise ValueError('Not a serialised NPC, or an unknown version')
+
+        try:
+            state = json.loads(zlib.decompress(data[header+1:]).decode('utf-8'))
+        except zlib.error as e:
+            raise ValueError(f'Truncated or corrupt serialised NPC: {e}') from e
+
+        return cls.from_dict(state)
+
+    ##################################################################################################
+    # Editing. Each edit updates the NPC in place and forgets only the sections it affects
+
+    def apply_career_rank(self, careername : str, rank : int):
+        """ Add a career rank to the end of the career history, e.g. ('Soldier', 2) """
+        self._npc.add_career_rank(careername.title(), rank)
+        self._npc.choose_spells()
+        self._invalidate()
+
+    def set_lore(self, lore : str):
+        """ Change the lore, renaming the skills and talents named after its wind. Raises
+            ValueError for an unknown lore """
+        self._npc.set_lore(lore)
+        self._npc.choose_spells()
+        self._invalidate(*self._talent_sections)
+
+    def set_characteristics(self, characteristics : dict):
+        """ Change some or all of the starting characteristics, keeping the advances from the
+            career history. Raises ValueError for unknown characteristics """
+        self._npc.set_characteristics(characteristics)
+        self._invalidate('statblock', *self._talent_sections)
+
+    def reroll_talents(self):
+        """ Choose the suggested talents again """
+        self._npc.reroll_talents()
+        self._invalidate(*self._talent_sections)
+
+    def reroll_spells(self):
+        """ Choose the spells again """
+        self._npc.reroll_spells()
+        self._npc.choose_spells()
 
     def _prep_career_history(self, firstcareer, careers_copy):
         career_name = careers_copy[0][0]
@@ -214,6 +463,11 @@ class NPC4e:
         """ Helpful error messages for Jodri developers """
         return self._error_diagnostic
 
+    @property
+    def errors(self) -> list:
+        """ Problems found with the request before building, as ValidationErrors """
+        return self._errors
+
     @classmethod
     def known_careers(cls) -> List[str]:
         """ All known careers """
@@ -254,6 +508,16 @@ class NPC4e:
 
         return sorted( list(known_species) )
 
+    # Index of known_species(), built the first time a species is suggested
+    _species_index = None
+
+    @classmethod
+    def suggest_species(cls, species : str, k : int = 3) -> List[str]:
+        """ Up to k known species which might be what was meant, best first """
+        if cls._species_index is None:
+            cls._species_index = FuzzyIndex(cls.known_species())
+        return [suggestion.option for suggestion in cls._species_index.suggest(species.lower(), k)]
+
     @classmethod
     def known_species_build(cls):
         """ Known species which can be used by the directed NPC builder """
@@ -276,64 +540,46 @@ class NPC4e:
 
     @filter.setter
     def filter(self, filter: str):
-        """ Change the presentation of the NPC, simplifying it to show social or combat relevant stats """
+        """ Change the presentation of the NPC, simplifying it to show social or combat relevant stats.
+            Sections are rendered lazily, and kept for each filter, so nothing is recomputed here """
         self._filter = filter
-        self._format()
 
-    def _format_talents(self, talents) -> str:
-        """ Return all talents as a footnoted list joined with commas """
-        return ', '.join('{}{}'.format(convert_number_to_footnote(v.get('skill_ref', 0)), k) for k, v in talents.items())
+    def _section(self, name : str, build, filtered : bool = True, filter : str = None, empty=''):
+        """ Return a rendered section, building it on first access. Sections which depend on 
+            the filter are kept separately for each filter value, the NPC's own filter unless
+            another is given. If building fails the error is kept, as if it happened while
+            building the NPC, and empty is returned """
+        if filtered:
+            key = (name, self._filter if filter is None else filter)
+        else:
+            key = (name, None)
+
+        if key not in self._sections:
+            try:
+                self._sections[key] = build()
+            except Exception as e:
+                self._record_error(e)
+                return empty
 
-    def _format(self):
-        """ Apply a filter to the NPC, allowing presentation to be simplified """
-        type = self._filter
+        return self._sections[key]
 
-        # Skills
-        skills_list = list()
-        filtered_skills_dict = Skills4().filter(self._npc.skills_verbose, type)
+    # The rendered sections which depend on the skills and talents
+    _talent_sections = ('crossref', 'skills', 'talents_initial', 'talents_suggested', 'talents_additional')
 
-        # Talents
-        t4 = Talents4()
-        if self._npc.talents_initial:
-            talents_initial = t4.filter(
-                self._npc.formatted_starting_talents, type)
+    def _invalidate(self, *names):
+        """ Forget the named sections, for every filter, so they're rendered again when next 
+            needed. With no names, forget everything """
+        if names:
+            self._sections = {key: value for key, value in self._sections.items() if key[0] not in names}
         else:
-            talents_initial = {}
-
-        talents_suggested = t4.filter(self._npc.talents_suggested, type)
-        talents_additional = t4.filter(self._npc.talents_additional, type)
-
-        # Association between skills and talents
-        filtered_skills_dict, talents_initial, index = skill_talent.associate(
-            filtered_skills_dict, talents_initial,   starting_index=1)
-        filtered_skills_dict, talents_suggested, index = skill_talent.associate(
-            filtered_skills_dict, talents_suggested,  starting_index=index)
-        filtered_skills_dict, talents_additional, index = skill_talent.associate(
-            filtered_skills_dict, talents_additional, starting_index=index)
-
-        # Format skills data
-        for skill, values in filtered_skills_dict.items():
-            for value in values:
-                superscripts = sorted(list(value.get('talent_ref', {0})))
-                if not superscripts[0] == 0:
-                    footnotes = [convert_number_to_footnote(i) for i in superscripts]
-                    superscript = ' '.join(footnotes)
-                    superscript = convert_to_superscript(f'({superscript})')
-                else:
-                    superscript = ''
-
-                if value['source'] and len(values) > 1:
-                    skills_list.append("{!s}: {!r}{} [{}; +{}]".format(
-                        skill, value['total'], superscript, value['source'], value['add']))
-                else:
-                    skills_list.append("{!s}: {!r}{}".format(
-                        skill, value['total'], superscript))
-                    #print("{}".format(', '.join("{!s}: {!r}".format(key,val) for (key,val) in npc.skills.items())))
-
-        self.__skills_crossedref = skills_list
-        self.__talents_applied_crossedref = talents_initial
-        self.__talents_suggested_crossedref = talents_suggested
-        self.__talents_additional_crossedref = talents_additional
+            self._sections = dict()
+
+    def _crossref(self, filter : str = None) -> tuple:
+        """ The skills and talents, filtered and cross-referenced with footnotes. They're kept for
+            each filter, and the NPC's own filter is used unless another is given """
+        filter = self._filter if filter is None else filter
+        return self._section('crossref', lambda: render_npc4.crossref(self._npc, filter), filter=filter,
+                             empty=([], {}, {}, {}))
 
     ##################################################################################################
     # Output properties
@@ -341,29 +587,29 @@ class NPC4e:
     @property
     def age(self) -> Tuple[str, int]:
         if self._age == 'young':
-            age = random.randint(12,19)
+            age = self._rng.randint(12,19)
         elif self._age == 'old':
-            age = random.randint(61,99)
+            age = self._rng.randint(61,99)
         else:
             age = 12
             # For each career level add a random number of years to the age based on
             # the career level
             for career, level in self._npc._career_history:
                 if level==0:
-                    age += random.randint(1,3)
+                    age += self._rng.randint(1,3)
                 elif level==1:
-                    age += random.randint(3,5)
+                    age += self._rng.randint(3,5)
                 elif level>1:
-                    age += random.randint(5,10)
+                    age += self._rng.randint(5,10)
             
             # If the character's final career level is greater than 1 then add
             # an additional random age factor which could make them any age between
             # their current unmodified age and 70. But include a random factor that
             # means some old NPCs can still be inexperienced
-            if level>1 or random.randint(0,100)<10:
-                age += random.randint( -2, max(0,70-age) )
+            if level>1 or self._rng.randint(0,100)<10:
+                age += self._rng.randint( -2, max(0,70-age) )
             else:
-                age += random.randint( -1, max(0,20-age) )
+                age += self._rng.randint( -1, max(0,20-age) )
 
         # Turn the age in years into a description, i.e. 'young', 'mature', 'old'
         age_descrip = 'mature'
@@ -374,9 +620,9 @@ class NPC4e:
         # The extra randint is so that every member of the species isn't suspiciously a multiple
         # of some integer in age
         if 'elf' in self._npc._index_species.lower():
-            age = (age*5) + random.randint(0,4)
+            age = (age*5) + self._rng.randint(0,4)
         elif self._npc._index_species.lower() in ['dwarf', 'halfling']:
-            age = (age*2) + random.randint(0,1)
+            age = (age*2) + self._rng.randint(0,1)
 
         return (age_descrip, age)
 
@@ -398,12 +644,13 @@ class NPC4e:
     @property
     def skills(self) -> str:
         """ A skills list, formatted with footnotes linking to taletnts, and joined by commas """
-        return ', '.join(self.__skills_crossedref)
+        return self._section('skills', lambda: render_npc4.format_skills(self._crossref()[0]))
     
     @property
     def social_standing(self) -> str:
         """ Build the social standing history from the NPC's career/rank history. """
-        return " → ".join([Careers4()[career][f'rank {rank}']['status'] for career, rank in self._npc._career_history])
+        return self._section('social_standing', filtered=False,
+                             build=lambda: render_npc4.social_standing(self._npc))
 
     @property
     def species(self) -> str:
@@ -421,14 +668,10 @@ class NPC4e:
     def statblock(self) -> str:
         """ The formatted (as a grid) statblock of the NPC, showing starting characteristics
             which do include modifications like Savvy, and final characteristics """
-        outstr = "`|{}|`\n".format(
-            '|'.join([f'{x:>3}' for x in self._npc.characteristics.keys()]))
-        outstr += "`|{}|`\n".format(
-            '|'.join([f'{x:3}' for x in self._npc.characteristics_base.values()]))
-        outstr += "`|{}|`".format(
-            '|'.join([f'{x:3}' for x in self._npc.characteristics.values()]))
-
-        return outstr
+        return self._section('statblock', filtered=False,
+                             build=lambda: render_npc4.format_statblock(self._npc.characteristics.keys(),
+                                                                        self._npc.characteristics_base.values(),
+                                                                        self._npc.characteristics.values()))
 
     @property
     def talents_initial(self) -> str:
@@ -436,7 +679,7 @@ class NPC4e:
             been applied, e.g. Suave. The string returned is formatted with italics for
             stat modifications applied, with footnotes linking to skills, and joined with
             commas. """
-        return self._format_talents(self.__talents_applied_crossedref)
+        return self._section('talents_initial', lambda: render_npc4.format_talents(self._crossref()[1]))
 
     @property
     def talents_suggested(self) -> str:
@@ -444,7 +687,7 @@ class NPC4e:
             one per career level, except where the careers data overrides. The string 
             returned is formatted with footnotes linking to skills, and joined with
             commas. """
-        return self._format_talents(self.__talents_suggested_crossedref)
+        return self._section('talents_suggested', lambda: render_npc4.format_talents(self._crossref()[2]))
 
     @property
     def talents_additional(self) -> str:
@@ -452,7 +695,7 @@ class NPC4e:
             already mentioned in the initial or suggested talents. The string 
             returned is formatted with footnotes linking to skills, and joined with
             commas. """
-        return self._format_talents(self.__talents_additional_crossedref)
+        return self._section('talents_additional', lambda: render_npc4.format_talents(self._crossref()[3]))
 
     @property
     def traits(self) -> str:
@@ -491,121 +734,26 @@ class NPC4e:
 
     @classmethod
     def help_message(cls) -> str:
-        return """Generates a fully described 4e non-player character with a career path and stats, plus info on appearence, background, family, etc., taking account of any info provided in the command. NPCs may be generated with user-defined species and career path, random species and career path, or a combination of the two.
-The syntax is:
-
-`jodri:npc4 [species] [<career(s)>] [<place>] [<info>]`
-
-... where <species> can be any 4e playable species or human variant or any race from the core rulebook's bestiary, 
-....<career(s)> can be a series of career ranks (e.g., `scholar 3`) or career level names (e.g., `professor`) between which Jodri will insert valid career steps if required. Use of the `any` keyword will insert a random career (only valid for playable races).
-... <place> can specify a place, e.g., Nuln (see help places for more info)
-... and <info> can specify further NPC details (see NPC info below for more info)."""
+        return _help_text
 
     @classmethod
     def examples_message(cls) -> str:
-        return """> `j:npc4` a completely random NPC (equivalent to `j:npc4 any`)
-> `j:npc4 dwarf` a dwarf NPC with a random career path (equivalent to `j:npc4 dwarf any`)
-> `j:npc4 fellow` an NPC (of random race) with career path: `student → scholar → fellow`
-> `j:npc4 fimir guard 2` a fimir NPC with career path: `sentry → guard`
-> `j:npc4 middenlander merchant witch23` a human Middenlander with career path: `trader → merchant → witch → wyrd`
-> `j:npc4 reiklander any scholar3` a human Reiklander with a random career path that ends with `Scholar 3` (i.e., `Fellow`)
-> `j:npc4 wood elf ghost strider any` a wood elf NPC with an initial career path of `forest ranger → ghost strider`, followed by a random onward career path
-> `j:npc4 stormvermin any` not a valid command as only playable races may have random career paths"""
+        return _examples_text
 
     @classmethod
     def info_message(cls) -> str:
-        return """
-Jodri understands:
-> Nationality: border princes / bretonnian / estalian / imperial / kislevite (ungol / gospodar) / norse / tilean
-> Region: e.g., reikland, skaeling, brionne, magritta, etc.
-> Birthplace: e.g., Nuln, Tobaro, etc. (check if I know about a place using j:lookup <place>)
-> Life Stage: boy / girl, young / mature / old, married / single
-> Build: emaciated / skinny / slight / slim / average / stocky / bulky / fat / huge (and tall / small)
-
-NPCs are generated according to the rules in the corebook p.314 ("Random Creatures and Custom PC Species") and Enemy in Shadows p.144 ("NPCs").
-
-Additional notes:
-- Characteristic modifying suggested or additional talents are not applied to the NPC.
-- The XP spend includes only characteristic and skill advances. Talents are not included.
-
-(Many thanks to @Monarda for this command!)"""
+        return _info_text
 
     @classmethod
     def help_messages(cls) -> List[tuple]:
-        big_string = """~~~NPC4~~~
-Generates a fully described 4e non-player character with a career path and stats, plus info on appearence, background, family, etc., taking account of any info provided in the command. NPCs may be generated with user-defined species and career path, random species and career path, or a combination of the two.
-The syntax is:
-
-`jodri:npc4 [species] [<career(s)>] [<place>] [<info>]`
-
-... where <species> can be any 4e playable species or human variant or any race from the core rulebook's bestiary, 
-....<career(s)> can be a series of career ranks (e.g., `scholar 3`) or career level names (e.g., `professor`) between which Jodri will insert valid career steps if required. Use of the `any` keyword will insert a random career path (only valid for playable races).
-... <place> can specify a place, e.g., Nuln (see help places for more info)
-... and <info> can specify further NPC details (see NPC info below for more info).
-
-~~~NPC4 Examples~~~
-> `j:npc4` a completely random NPC (equivalent to `j:npc4 any`)
-> `j:npc4 dwarf` a dwarf NPC with a random career path (equivalent to `j:npc4 dwarf any`)
-> `j:npc4 fellow` an NPC (of random race) with career path: `student → scholar → fellow`
-> `j:npc4 fimir guard 2` a fimir NPC with career path: `sentry → guard`
-> `j:npc4 middenlander merchant witch23` a human Middenlander with career path: `trader → merchant → witch → wyrd`
-> `j:npc4 reiklander any scholar3` a human Reiklander with a random career path that ends with `Scholar 3` (i.e., `Fellow`)
-> `j:npc4 wood elf ghost strider any` a wood elf NPC with an initial career path of `forest ranger → ghost strider`, followed by a random onward career path
-> `j:npc4 stormvermin any` not a valid command as only playable races may have random career paths
-> `j:npc young emaciated mutated reikland rat catcher`
-
-~~~NPC4 Info~~~
-Jodri understands:
-> Nationality: `border princes` / `bretonnian` / `estalian` / `imperial` / `kislevite` (`ungol` / `gospodar`) / `norse` / `tilean`
-> Region: e.g., `reikland`, `skaeling`, `brionne`, `magritta`, etc.
-> Birthplace: e.g., `Nuln`, `Tobaro`, etc. (check if I know about a place using `j:lookup <place>`)
-> Life Stage: `boy` / `girl`, `young` / `mature` / `old`, `married` / `single`
-> Build: `emaciated` / `skinny` / `slight` / `slim` / `average` / `stocky` / `bulky` / `fat` / `huge` (and `tall` / `small`)
-> Imperial Pronunciation: turn it off using `nopro`
-...and many other aspects of an npc can be specified using =: e.g., `eyes=Grey-Green`, `name=Hans`, `surname=Schmeckl`, `god=Sigmar`, `mutations=4`, etc.
-
-~~~NPC4 Explanations~~~
-NPCs are generated according to the rules in the corebook p.314 ("Random Creatures and Custom PC Species") and Enemy in Shadows p.144 ("NPCs").
+        """ The full help text as (title, text) chunks of under 1024 characters """
+        return list(cls._message_chunks['all'])
 
-Additional notes:
-- Characteristic modifying suggested or additional talents are not applied to the NPC.
-- The XP spend includes only characteristic and skill advances. Talents are not included.
-
-(Many thanks to @Monarda for this command!)"""
-
-
-        # Split the big help text message into lines
-        little_strings = big_string.splitlines(True)
-
-        # Divide the lines into a title (may be blank) and chunks of less than 1024 characters
-        output_strings = []
-        title = ''
-        chunk = ''
-        for line in little_strings:
-            # See if we've detected a new title
-            if line.strip().startswith('~~~') and line.strip().endswith('~~~'):
-                # We have a new title so we need to start a new tuple
-                # and store the old tuple (if it exists)
-                if chunk:
-                    output_strings.append((title, chunk))
-                    chunk = ''
-                    char_count = 0
-
-                title = line.strip().strip('~')
-                continue
-
-            # Continue building up the chunk
-            if len(chunk) + len(line) < 1024:
-                chunk += line
-            else:
-                output_strings.append((title, chunk))
-                title = title + ' [cont...]'
-                chunk = line
-
-        if chunk:
-            output_strings.append((title, chunk))
-            
-        return output_strings
+    @classmethod
+    def message_chunks(cls, message : str = 'all') -> Tuple[tuple]:
+        """ The 'help', 'examples', 'info' or 'all' messages as (title, text) chunks of under 
+            1024 characters. These are chunked once, on import """
+        return cls._message_chunks[message]
 
 
 
@@ -0,0 +1,60 @@
+import collections
+import sys
+import threading
+
+class ByteLRUCache:
+    """ A least recently used cache bounded by the total size of its values in bytes, rather
+        than by the number of entries. Values bigger than the whole cache aren't stored.
+        It's safe to share between threads """
+
+    def __init__(self, max_bytes : int, sizeof=sys.getsizeof):
+        self.max_bytes = max_bytes
+        self.nbytes    = 0
+        self.hits      = 0
+        self.misses    = 0
+
+        self._sizeof = sizeof
+        self._data   = collections.OrderedDict()  # key: (value, size)
+        self._lock   = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        """ The cached value for key (which becomes the most recently used), or default """
+        with self._lock:
+            try:
+                value, _ = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value) -> None:
+        """ Store a value, dropping the least recently used values until it fits """
+        size = self._sizeof(value)
+        with self._lock:
+            if key in self._data:
+                self.nbytes -= self._data.pop(key)[1]
+            if size > self.max_bytes:
+                return
+
+            while self.nbytes + size > self.max_bytes:
+                _, (_, dropped) = self._data.popitem(last=False)
+                self.nbytes -= dropped
+
+            self._data[key] = (value, size)
+            self.nbytes += size
+
+    def clear(self, stats : bool = False) -> None:
+        """ Empty the cache, and also reset the hits and misses if stats is True """
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+            if stats: self.hits = self.misses = 0
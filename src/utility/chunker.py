@@ -0,0 +1,48 @@
+from typing import Iterable, Iterator, Tuple
+
+def _is_title(line : str) -> bool:
+    """ Titles are lines of the form ~~~Title~~~ """
+    line = line.strip()
+    return len(line) > 6 and line.startswith('~~~') and line.endswith('~~~')
+
+def _split_long_line(line : str, limit : int) -> Iterator[str]:
+    """ Split a line which won't fit in a chunk on its own, preferably at spaces """
+    while len(line) >= limit:
+        cut = line.rfind(' ', 0, limit-1) + 1 or limit-1
+        yield line[:cut]
+        line = line[cut:]
+    if line:
+        yield line
+
+def chunk_lines(lines : Iterable[str], title : str = '', limit : int = 1024, continued : str = ' [cont...]') -> Iterator[Tuple[str, str]]:
+    """ Split lines of text into (title, chunk) tuples with every chunk shorter than limit
+        characters, e.g. for the fields of a Discord embed.
+
+        A line of the form ~~~Title~~~ starts a new chunk with that title. When a chunk
+        overflows the rest continues under the same title with continued appended. Lines
+        should keep their line endings. This is a generator, so lines can be a stream.
+    """
+    parts, size = [], 0
+    for line in lines:
+        if _is_title(line):
+            if parts:
+                yield title, ''.join(parts)
+                parts, size = [], 0
+            title = line.strip().strip('~')
+            continue
+
+        for piece in _split_long_line(line, limit):
+            if size + len(piece) >= limit:
+                yield title, ''.join(parts)
+                parts, size = [], 0
+                if not title.endswith(continued): title += continued
+
+            parts.append(piece)
+            size += len(piece)
+
+    if parts:
+        yield title, ''.join(parts)
+
+def chunk_text(text : str, title : str = '', limit : int = 1024, continued : str = ' [cont...]') -> Iterator[Tuple[str, str]]:
+    """ Split any rendered text into (title, chunk) tuples, see chunk_lines() """
+    return chunk_lines(text.splitlines(True), title, limit, continued)
@@ -1,15 +1,25 @@
-import math, re
+import bisect
+import collections
+import math, os, re
+
+from .byte_lru_cache import ByteLRUCache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 def find_whole_words(target, options):
     """ Find a whole word in a set of options, and return the option that matches
         e.g. target = 'apple', options = {'apple sauce', 'brandy butter', 'applejack'}
-        will return 'apple sauce' 
+        will return 'apple sauce'. Case is ignored
 
         If no match is found it will return None
     """
     target_match = None
+    pattern = re.compile(r"\b" + re.escape(target.casefold()) + r"\b")
     for option in options:
-        careerfound = re.findall(r"\b" + target + r"\b", option)
+        careerfound = pattern.findall(option.casefold())
         if target_match and careerfound:
             return target
         elif careerfound:
@@ -30,7 +40,6 @@ def find_longest_prefix(target, options):
     longest_match  = None
     ambiguous = False
     for option in options:
-        import os
         longest_this_option = os.path.commonprefix([target,option])
         if len(longest_this_option)>len(longest_prefix):
             longest_prefix = longest_this_option
@@ -90,7 +99,458 @@ def damerau_levenshtein_distance(s1, s2):
     return d[lenstr1-1,lenstr2-1]
 
 
-def find_best_match(target, options):
+def osa_distance(s1, s2, max_distance=None):
+    """
+    The same distance as damerau_levenshtein_distance (i.e. optimal string alignment), but
+    computed a row at a time. If max_distance is given then max_distance+1 is returned as
+    soon as the distance is known to be greater than max_distance
+    """
+    if max_distance is not None and abs(len(s1)-len(s2)) > max_distance:
+        return max_distance+1
+
+    # With a maximum only a band of max_distance either side of the diagonal can be under it,
+    # so cells outside the band are left at a value over the maximum
+    lenstr2 = len(s2)
+    band = max(len(s1), lenstr2) if max_distance is None else max_distance
+    outside = band+1
+    previous2 = None
+    previous  = [j if j <= band else outside for j in range(lenstr2+1)]
+    for i, c1 in enumerate(s1, 1):
+        current = [i if i <= band else outside] + [outside]*lenstr2
+        for j in range(max(1, i-band), min(lenstr2, i+band)+1):
+            c2 = s2[j-1]
+            cost = 0 if c1 == c2 else 1
+            distance = min(previous[j] + 1,         # deletion
+                           current[j-1] + 1,        # insertion
+                           previous[j-1] + cost)    # substitution
+            if i > 1 and j > 1 and c1 == s2[j-2] and s1[i-2] == c2:
+                distance = min(distance, previous2[j-2] + cost) # transposition
+            current[j] = distance
+
+        # Every entry in a row comes from the two rows before, so once two rows in a row
+        # are over the limit all the rest will be too
+        if max_distance is not None and min(current) > max_distance and min(previous) > max_distance:
+            return max_distance+1
+
+        previous2, previous = previous, current
+
+    if max_distance is not None and previous[lenstr2] > max_distance:
+        return max_distance+1
+
+    return previous[lenstr2]
+
+
+def _pad_codes(options):
+    """ The character codes of the options as an array padded with -1, and their lengths """
+    lengths = np.array([len(option) for option in options], dtype=np.int64)
+    codes = np.full((len(options), max(lengths, default=0)), -1, dtype=np.int64)
+    for idx, option in enumerate(options):
+        codes[idx, :len(option)] = [ord(c) for c in option]
+    return codes, lengths
+
+def _osa_kernel(target, codes, lengths, max_distance=None, ends=None):
+    """ osa_distance from target to every row of a padded code array at once. Each row of the
+        dynamic programme is computed for all options together, and the insertions along the
+        row are a running minimum. Padding only ever affects the columns after an option ends.
+
+        ends is an array of the columns to read for each option, one per option or a row of
+        them, e.g. to get the distance to the start of each option as well. It defaults to
+        lengths, the distance to the whole option """
+    n, width = codes.shape
+    columns = np.arange(width+1)
+    if ends is None: ends = lengths
+    target_codes = [ord(c) for c in target]
+
+    # Padding is excluded from each option's row minimum for the early exit
+    padding = columns[np.newaxis, :] > lengths[:, np.newaxis]
+    over = np.zeros(n, dtype=bool)
+
+    previous2 = None
+    previous  = np.broadcast_to(columns, (n, width+1)).copy()
+    for i, c1 in enumerate(target_codes, 1):
+        cost = (codes != c1).astype(np.int64)
+        current = np.empty_like(previous)
+        current[:, 0] = i
+        current[:, 1:] = np.minimum(previous[:, 1:] + 1,           # deletion
+                                    previous[:, :-1] + cost)       # substitution
+        if i > 1 and width > 1:
+            swap = (codes[:, :-1] == c1) & (codes[:, 1:] == target_codes[i-2])
+            current[:, 2:] = np.where(swap, np.minimum(current[:, 2:], previous2[:, :-2] + cost[:, 1:]), current[:, 2:])
+
+        # Insertion: current[j] = min over k <= j of current[k] + (j-k)
+        current = np.minimum.accumulate(current - columns, axis=1) + columns
+
+        if max_distance is not None:
+            row_over = np.where(padding, max_distance+1, current).min(axis=1) > max_distance
+            if (row_over & over).all():
+                return np.full(ends.shape, max_distance+1, dtype=np.int64)
+            over = row_over
+
+        previous2, previous = previous, current
+
+    rows = np.arange(n).reshape((n,) + (1,)*(ends.ndim-1))
+    distances = previous[rows, ends]
+    if max_distance is not None:
+        distances = np.minimum(distances, max_distance+1)
+    return distances
+
+def osa_distances(target, options, max_distance=None):
+    """ osa_distance from target to each of the options, as a list. With numpy this is done
+        in one batched sweep, otherwise one option at a time """
+    options = list(options)
+    if np is None or not options:
+        return [osa_distance(target, option, max_distance) for option in options]
+
+    return _osa_kernel(target, *_pad_codes(options), max_distance).tolist()
+
+
+# A ranked suggestion from FuzzyIndex.suggest()
+#   option - one of the options
+#   score  - how well it matches, from 0 to 1 (exact)
+#   stage  - the heuristic that found it, one of FuzzyIndex.stages
+Suggestion = collections.namedtuple('Suggestion', ['option', 'score', 'stage'])
+
+# Statistics of the memo of a FuzzyIndex, in the style of functools.lru_cache
+CacheInfo = collections.namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+def _count_one(value):
+    return 1
+
+_missing = object()
+
+
+class FuzzyIndex:
+    """ An index over a set of options for find_best_match, built once and then used for
+        any number of targets. Results are the same as the original heuristics, stage by
+        stage, but each stage uses an index rather than scanning every option:
+
+           2. whole words are looked up in a dictionary of the words in each option
+           3. prefixes are found by binary search of the sorted options
+           4. edit distances are only calculated for options of a similar length, closest
+              length first, since the distance is at least the difference in length. (A
+              BK-tree would need a true metric, which optimal string alignment isn't)
+    """
+
+    max_distance = 4    # Edit distance matches must score 1 - distance > -4
+    batch_size   = 32   # With numpy, batch the edit distances when there are at least this many options to try
+
+    # For mode='ngram'
+    ngram         = 3   # Length of the character n-grams
+    ngram_limit   = 32  # Edit distances are only calculated for this many of the options sharing most n-grams
+    partial_cost  = 0.5 # The extra cost of a match which is only a prefix or a whole word of the option
+
+    modes = ('staged', 'ngram')
+
+    memo_size = 1024    # Results remembered per index, including targets which matched nothing
+
+    # Longer targets (e.g. a pasted paragraph) can't be a misspelling of any option, and would
+    # only make the edit distances slow, so they're rejected before any matching. With that,
+    # the escaped whole word regex and the banded edit distance the worst case is bounded by
+    # the number of options: scripts/bench_find_best_match.py measures best_match() plus
+    # suggest() without the memo at no more than about 3ms for the careers or lores, and
+    # about 10ms for all spells and talents (594 options), whatever the target
+    max_target_length = 64
+
+    def __init__(self, options, mode : str = 'staged'):
+        """ mode 'staged' (the default) tries the original heuristics in order. 'ngram' prunes
+            the options to those sharing the most character n-grams and scores prefix, whole word
+            and edit distance evidence together, see best_match_ngram() """
+        if mode not in self.modes:
+            raise ValueError(f'Unknown FuzzyIndex mode {mode}, must be one of {self.modes}')
+        self.mode = mode
+        self.options = tuple(options)
+        self._memo = ByteLRUCache(self.memo_size, sizeof=_count_one)
+        self._option_set = frozenset(self.options)
+        self._position = dict()
+        for idx, option in enumerate(self.options):
+            self._position.setdefault(option, idx)
+
+        # Whole words, case-folded, in the order of the options
+        self._words = dict()
+        for idx, option in enumerate(self.options):
+            for word in dict.fromkeys(re.findall(r'\w+', option.casefold())):
+                self._words.setdefault(word, []).append(idx)
+
+        self._sorted = sorted(self.options)
+
+        self._by_length = dict()
+        for idx, option in enumerate(self.options):
+            self._by_length.setdefault(len(option), []).append(idx)
+
+        if np is not None:
+            self._codes, self._lengths = _pad_codes(self.options)
+
+        self._grams = None
+        if mode == 'ngram':
+            self._folded = tuple(option.casefold() for option in self.options)
+            if np is not None:
+                self._folded_codes, self._folded_lengths = _pad_codes(self._folded)
+            self._grams = dict()
+            for idx, option in enumerate(self._folded):
+                for gram in self._ngrams(option):
+                    self._grams.setdefault(gram, []).append(idx)
+
+    def __len__(self):
+        return len(self.options)
+
+    # The heuristics in the order they're tried, which is also the order suggestions are ranked
+    stages = ('exact', 'word', 'prefix', 'distance')
+
+    def whole_word(self, target):
+        """ As find_whole_words(target, options) """
+        matches = self._word_matches(target)
+        if len(matches) > 1: return target
+        return self.options[matches[0]] if matches else None
+
+    def longest_prefix(self, target):
+        """ As find_longest_prefix(target, options) """
+        if not self.options: return None
+
+        # The longest common prefix is always with one of the neighbours in sorted order
+        position = bisect.bisect_left(self._sorted, target)
+        neighbours = self._sorted[max(position-1, 0):position+1]
+        longest = max(len(os.path.commonprefix([target, option])) for option in neighbours)
+        if longest == 0: return None
+
+        prefix = target[:longest]
+        lo = bisect.bisect_left(self._sorted, prefix)
+        hi = bisect.bisect_left(self._sorted, prefix + '\U0010ffff', lo)
+        if hi - lo > 1: return None
+
+        return self._sorted[lo]
+
+    def closest(self, target):
+        """ The first option with the smallest edit distance to target, provided it's no more
+            than max_distance, otherwise None """
+        length = len(target)
+        if np is not None:
+            candidates = np.flatnonzero(np.abs(self._lengths - length) <= self.max_distance)
+            if len(candidates) >= self.batch_size:
+                return self._closest_batch(target, candidates)
+
+        best_distance, best_idx = self.max_distance+1, None
+        for difference in range(0, self.max_distance+1):
+            if difference > best_distance: break
+
+            lengths = (length,) if difference == 0 else (length-difference, length+difference)
+            for idx in sorted(idx for l in lengths for idx in self._by_length.get(l, [])):
+                distance = osa_distance(target, self.options[idx], min(best_distance, self.max_distance))
+                if distance <= self.max_distance and (distance, idx) < (best_distance, best_idx if best_idx is not None else math.inf):
+                    best_distance, best_idx = distance, idx
+
+        return self.options[best_idx] if best_idx is not None else None
+
+    def _closest_batch(self, target, candidates):
+        """ closest() for many candidates at once with the numpy kernel """
+        lengths = self._lengths[candidates]
+        codes = self._codes[candidates, :lengths.max()]
+        distances = _osa_kernel(target, codes, lengths, self.max_distance)
+
+        best = int(np.argmin(distances))     # argmin picks the first, so the lowest index
+        return self.options[candidates[best]] if distances[best] <= self.max_distance else None
+
+    @classmethod
+    def _ngrams(cls, text):
+        """ The distinct n-grams of text, padded so the start of the text has n-grams of its own """
+        text = ' '*(cls.ngram-1) + text + ' '
+        return set(text[i:i+cls.ngram] for i in range(len(text)-cls.ngram+1))
+
+    def _ngram_candidates(self, target):
+        """ Indices of the options sharing the most n-grams with target, most first """
+        shared = collections.Counter()
+        for gram in self._ngrams(target):
+            shared.update(self._grams.get(gram, ()))
+        return [idx for idx, _ in sorted(shared.items(), key=lambda item: (-item[1], item[0]))[:self.ngram_limit]]
+
+    def best_match_ngram(self, target):
+        """ The option with the lowest combined cost, where the cost of an option is the least of
+              - the edit distance to the whole option
+              - the edit distance to the start of the option, plus partial_cost
+              - partial_cost, if target is a whole word of the option
+            Only the options sharing most n-grams with target are scored. Matches must cost no
+            more than half the length of target or max_distance, ties going to the first
+            option, so prefixes no longer win over better spellings, e.g. 'Vriest' is
+            Priest rather than the first career starting with V """
+        if len(target)<3 or target in self._option_set:
+            return target
+
+        folded = target.casefold()
+        candidates = self._ngram_candidates(folded)
+        if not candidates:
+            return target
+
+        options = [self._folded[idx] for idx in candidates]
+        if np is not None:
+            # One sweep gives both, reading the column at the end of target as well
+            lengths = self._folded_lengths[candidates]
+            ends = np.stack([lengths, np.minimum(lengths, len(folded))], axis=1)
+            codes = self._folded_codes[candidates, :lengths.max()]
+            whole, starts = _osa_kernel(folded, codes, lengths, self.max_distance, ends).T.tolist()
+        else:
+            whole  = osa_distances(folded, options, self.max_distance)
+            starts = osa_distances(folded, [option[:len(folded)] for option in options], self.max_distance)
+        words = set(self._word_matches(target))
+
+        best = None
+        for idx, option, distance, start in zip(candidates, options, whole, starts):
+            cost = min(distance, start + self.partial_cost if len(option) > len(folded) else distance)
+            if idx in words: cost = min(cost, self.partial_cost)
+            if best is None or (cost, idx) < best: best = (cost, idx)
+
+        cost, idx = best
+        if cost > self.max_distance or cost > len(folded)/2:
+            return target
+        return self.options[idx]
+
+    def cache_info(self) -> CacheInfo:
+        """ Hits and misses of the memo of results """
+        return CacheInfo(self._memo.hits, self._memo.misses, self.memo_size, len(self._memo))
+
+    def cache_clear(self) -> None:
+        self._memo.clear(stats=True)
+
+    def best_match(self, target):
+        """ As find_best_match(target, options), or best_match_ngram() in mode 'ngram'. Results
+            are memoised, since the same typos and abbreviations come up again and again """
+        if len(target) > self.max_target_length:
+            return target
+
+        key = ('best', target)
+        result = self._memo.get(key, _missing)
+        if result is _missing:
+            result = self._best_match(target)
+            self._memo.put(key, result)
+        return result
+
+    def _best_match(self, target):
+        if self.mode == 'ngram':
+            return self.best_match_ngram(target)
+
+        # Don't even try to match if we've been given fewer than three characters
+        if len(target)<3:
+            return target
+
+        if target in self._option_set:
+            return target
+
+        word_match = self.whole_word(target)
+        if word_match: return word_match
+
+        prefix_match = self.longest_prefix(target)
+        if prefix_match:
+            if len(prefix_match)<len(target): return prefix_match
+
+            # Score the prefix - every letter that doesn't match reduces the score
+            count = len(os.path.commonprefix([target, prefix_match]))
+            if 2*count - len(target) > 0: return prefix_match
+
+        closest = self.closest(target)
+        return closest if closest is not None else target
+
+
+    def _word_matches(self, target):
+        """ The indices of every option containing target as a whole word, ignoring case """
+        target = target.casefold()
+        if re.fullmatch(r'\w+', target):
+            return self._words.get(target, [])
+
+        pattern = re.compile(r'\b' + re.escape(target) + r'\b')
+        return [idx for idx, option in enumerate(self.options) if pattern.search(option.casefold())]
+
+    def _prefix_matches(self, target):
+        """ The options sharing the longest common prefix with target, provided the prefix
+            would pass the prefix stage of best_match, and the prefix length """
+        if not self.options: return [], 0
+
+        position = bisect.bisect_left(self._sorted, target)
+        neighbours = self._sorted[max(position-1, 0):position+1]
+        longest = max(len(os.path.commonprefix([target, option])) for option in neighbours)
+        if 2*longest - len(target) <= 0: return [], 0
+
+        prefix = target[:longest]
+        lo = bisect.bisect_left(self._sorted, prefix)
+        hi = bisect.bisect_left(self._sorted, prefix + '\U0010ffff', lo)
+        return self._sorted[lo:hi], longest
+
+    def _distances(self, target):
+        """ (distance, index) for every option within max_distance of target """
+        candidates = [idx for difference in range(-self.max_distance, self.max_distance+1)
+                      for idx in self._by_length.get(len(target)+difference, [])]
+        distances = osa_distances(target, [self.options[idx] for idx in candidates], self.max_distance)
+        return [(distance, idx) for distance, idx in zip(distances, candidates) if distance <= self.max_distance]
+
+    def suggest(self, target, k=3):
+        """ Up to k options which might be what target meant, best first, as Suggestions. Unlike
+            best_match every stage contributes, so an ambiguous whole word or prefix gives all
+            of its options. The first suggestion is usually, but not always, the best match.
+            Results are memoised like best_match() """
+        if len(target) > self.max_target_length:
+            return []
+
+        key = ('suggest', target, k)
+        result = self._memo.get(key, _missing)
+        if result is _missing:
+            result = tuple(self._suggest(target, k))
+            self._memo.put(key, result)
+        return list(result)
+
+    def _suggest(self, target, k):
+        if not target: return []
+
+        found = dict()      # option: (stage rank, -score, index)
+        def add(option, score, stage):
+            key = (self.stages.index(stage), -score, self._position[option])
+            if option not in found or key < found[option]:
+                found[option] = key
+
+        if target in self._option_set:
+            add(target, 1.0, 'exact')
+
+        for idx in self._word_matches(target):
+            option = self.options[idx]
+            add(option, len(target)/max(len(option), 1), 'word')
+
+        options, longest = self._prefix_matches(target)
+        for option in options:
+            add(option, longest/max(len(option), len(target)), 'prefix')
+
+        for distance, idx in self._distances(target):
+            option = self.options[idx]
+            add(option, 1 - distance/max(len(option), len(target)), 'distance')
+
+        ranked = sorted(found.items(), key=lambda item: item[1])[:k]
+        return [Suggestion(option, -score, self.stages[stage]) for option, (stage, score, _) in ranked]
+
+
+# Indexes shared between callers of find_best_match() and suggest(), keyed by the options
+# themselves. A different set of options is a different key, so a changed set never sees the
+# old results
+_indexes = ByteLRUCache(64, sizeof=_count_one)
+
+def fuzzy_index(options, mode : str = 'staged') -> FuzzyIndex:
+    """ The shared FuzzyIndex for a set of options, built the first time it's asked for. Finding
+        it means going through the options, so callers matching against the same options again
+        and again should keep their own FuzzyIndex """
+    options = tuple(options)
+    key = (options, mode)
+    index = _indexes.get(key)
+    if index is None:
+        index = FuzzyIndex(options, mode)
+        _indexes.put(key, index)
+    return index
+
+def suggest(target, options, k=3):
+    """ Up to k Suggestions for target from the options, see FuzzyIndex.suggest() """
+    return fuzzy_index(options).suggest(target, k)
+
+def did_you_mean(names) -> str:
+    """ A sentence offering some suggestions to the user, or '' if there are none """
+    names = list(names)
+    if not names: return ''
+    if len(names) == 1: return f' Did you mean {names[0]}?'
+    return ' Did you mean {} or {}?'.format(', '.join(names[:-1]), names[-1])
+
+def find_best_match(target, options, mode='staged'):
     """Use some simple heuristics to find the best match of a target string in a set 
     of options.
 
@@ -101,47 +561,9 @@ def find_best_match(target, options):
        2. If a whole word matches in the options then return it, e.g. 'magus' for 'cult magus of tzeentch'
        3. Prefixes are matched, e.g. 'apo' for 'apothecary'
        4. Leventshtein distance to compensate for misspellings, e.g. 'oriest' for 'priest'
-    """
-
-    # Don't even try to match if we've been given fewer than three characters
-    if len(target)<3:
-        return target
-
-    # Exact matches are easy!
-    if target in options:
-        return target
-
-    # Check if words match
-    word_match = find_whole_words(target, options)
-    if word_match: return word_match
-
-    # Check if it's a shortening
-    # Ideally we should score the result so we can use this or the Leventshtein
-    # distance as appropriate
-    # At the moment 'vriest' says 'villager' instead of 'priest'
-    prefix_match = find_longest_prefix(target,options)
-    if prefix_match:
-        if len(prefix_match)<len(target): return prefix_match
-
-    if prefix_match: 
-        ## Score the prefix - every letter that doesn't match reduces the score
-        count = 0
-        for idx, char in enumerate(list(target)):
-            if char!=prefix_match[idx]:
-                break
-            else: count += 1
-
-        #score = count - (len(target) - count)
-        score = 2*count - len(target)
-        if score>0: return prefix_match
-
-    # Leventshtein distance is good for misspellings but bad for abbreviations
-    scores = {}
-    for option in options:
-        scores[option] = 1 - damerau_levenshtein_distance(target,option)
-
-    import operator
-    bestmatch = max(scores.items(), key=operator.itemgetter(1))[0]
-    if scores[bestmatch] > -4: return bestmatch
-    else: return target
 
+    With mode='ngram' prefix and edit distance evidence are scored together instead, see
+    FuzzyIndex.best_match_ngram(). The index for the options is shared and remembers its
+    results, see fuzzy_index().
+    """
+    return fuzzy_index(options, mode).best_match(target)
@@ -0,0 +1,106 @@
+import itertools
+import random
+from typing import Any, Sequence
+
+class WeightedTable:
+    """ A weighted random table, built once and then drawn from in O(1) using Vose's alias method.
+
+        Takes the same weights or cum_weights as random.choices, e.g.
+        WeightedTable(['Human','Halfling','Dwarf'], cum_weights=[89,92,100]).draw()
+
+        By default draws use the random module's global generator, so random.seed() still
+        applies. Pass rng (a random.Random) to use a separate generator, seeded by the caller.
+    """
+
+    def __init__(self, items : Sequence, weights : Sequence = None, cum_weights : Sequence = None, rng=None):
+        self._items = tuple(items)
+
+        if cum_weights is not None:
+            if weights is not None:
+                raise TypeError('Cannot specify both weights and cumulative weights')
+            weights = [b-a for a, b in zip(itertools.chain([0], cum_weights), cum_weights)]
+        elif weights is None:
+            weights = [1]*len(self._items)
+
+        if len(weights) != len(self._items):
+            raise ValueError('The number of weights does not match the number of items')
+
+        self._weights = tuple(weights)
+        self._total   = sum(self._weights)
+        self._rng     = random if rng is None else rng
+
+        self._build_alias()
+
+    def _build_alias(self):
+        """ Vose's alias method. Only items with a positive weight take part, so items with
+            zero weight can never be drawn whatever the floating point rounding """
+        positive = [idx for idx, weight in enumerate(self._weights) if weight > 0]
+        n = len(positive)
+
+        self._alias_items = tuple(self._items[idx] for idx in positive)
+        self._prob  = [1.0]*n
+        self._alias = list(range(n))
+        if not n: return
+
+        scaled = [self._weights[idx] * n / self._total for idx in positive]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+
+            self._prob[s]  = scaled[s]
+            self._alias[s] = l
+
+            scaled[l] = (scaled[l] + scaled[s]) - 1.0
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+
+        # Anything left over is 1.0 give or take rounding
+        for i in itertools.chain(small, large):
+            self._prob[i] = 1.0
+
+    @property
+    def items(self) -> tuple:
+        return self._items
+
+    @property
+    def weights(self) -> tuple:
+        return self._weights
+
+    @property
+    def total(self):
+        """ Sum of the weights. Drawing from a table with a total of zero raises a ValueError """
+        return self._total
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def probability(self, item) -> float:
+        """ The probability of drawing this item """
+        if not self._total: return 0.0
+        return sum(weight for x, weight in zip(self._items, self._weights) if x == item) / self._total
+
+    def draw(self, k : int = None, rng=None) -> Any:
+        """ Draw one item, or a list of k items (with replacement) if k is given. rng is a
+            random.Random to draw with instead of the table's own generator """
+        if not self._alias_items:
+            raise ValueError('Total of weights must be greater than zero')
+
+        rng = self._rng if rng is None else rng
+        n = len(self._alias_items)
+        items, prob, alias = self._alias_items, self._prob, self._alias
+
+        if k is None:
+            u = rng.random() * n
+            i = min(int(u), n-1)
+            return items[i] if (u - i) < prob[i] else items[alias[i]]
+
+        # A batch: k columns of the alias table, then k uniforms to choose between each
+        # column's own item and its alias
+        columns  = rng.choices(range(n), k=k)
+        uniforms = [rng.random() for _ in columns]
+        return [items[i] if u < prob[i] else items[alias[i]] for i, u in zip(columns, uniforms)]